@@ -0,0 +1,26 @@
+""" 
+Thin client of the compressor daemon (see project.py --serve). 
+
+It accepts the same command-line arguments as project.py, but forwards them to the running daemon, so that
+only the standard library is loaded on each call. If no daemon is running, the command runs in this process.
+"""
+
+import sys
+from modules.daemon import send_request, DaemonNotRunning
+
+
+def main():
+    try:
+        (status, stdout, stderr) = send_request(sys.argv[1:])
+    except DaemonNotRunning:
+        import project
+        project.main()
+        return
+
+    sys.stdout.write(stdout)
+    sys.stderr.write(stderr)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
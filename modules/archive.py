@@ -0,0 +1,256 @@
+import os
+from collections import namedtuple
+from .huffman import compress_text, decompress_data, encode_varint, decode_varint, EmptyFile, NotCompressable, \
+    NoHeader, InvalidPadding
+
+"""
+Archives pack many compressed files (members) in a single file. Each member is stored exactly as a compressed
+file would be written by project.py (header, encoded text and padding information), so it keeps its own code
+table and can be decompressed alone.
+
+The table of contents is written after the members, like in zip files, so that adding members only needs to
+rewrite the table of contents: the members already in the archive are not recompressed nor moved.
+Archive format:
+    <ARCHIVE_MAGIC><member>...<member><table of contents><table of contents offset><ARCHIVE_MAGIC>
+Table of contents format (all numbers are varints):
+    <member count><name size><name><offset><compressed size><original size>...
+The table of contents offset is a ARCHIVE_OFFSET_SIZE bytes big-endian integer.
+"""
+
+ARCHIVE_MAGIC = b'HUFA'
+ARCHIVE_OFFSET_SIZE = 8
+
+ArchiveMember = namedtuple(
+    'ArchiveMember', ['name', 'offset', 'size', 'original_size'])
+
+
+class InvalidArchive(Exception):
+    pass
+
+
+class MemberNotFound(Exception):
+    pass
+
+
+def member_name(file: str):
+    """
+    Gets the name under which a file is stored in the archive: its relative path, or only its base name if the
+    path leaves the current directory
+
+    :param file: path of the file to be archived
+    :type file: str
+    :return: member name, always with '/' as separator
+    :rtype: str
+    """
+    name = os.path.normpath(file)
+    if os.path.isabs(name) or name.startswith(os.pardir):
+        name = os.path.basename(name)
+    return name.replace(os.sep, '/')
+
+
+def read_table_of_contents(archive: str):
+    """
+    Reads the table of contents at the end of the archive
+
+    :param archive: archive file
+    :type archive: str
+    :return: members of the archive and the offset of the table of contents (where new members are written)
+    :rtype: tuple
+    :raises InvalidArchive: if the file is not an archive
+    """
+    with open(archive, 'rb') as archive_file:
+        if archive_file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise InvalidArchive("Given file is not a huffman archive")
+        if archive_file.seek(0, os.SEEK_END) < 2 * len(ARCHIVE_MAGIC) + ARCHIVE_OFFSET_SIZE:
+            raise InvalidArchive("Given archive has no table of contents")
+
+        archive_file.seek(-(ARCHIVE_OFFSET_SIZE + len(ARCHIVE_MAGIC)), os.SEEK_END)
+        trailer = archive_file.read()
+        if trailer[ARCHIVE_OFFSET_SIZE:] != ARCHIVE_MAGIC:
+            raise InvalidArchive("Given archive has no table of contents")
+
+        toc_offset = int.from_bytes(trailer[:ARCHIVE_OFFSET_SIZE], 'big')
+        archive_file.seek(toc_offset)
+        data = archive_file.read()[:-len(trailer)]
+
+    members = list()
+    try:
+        (member_count, position) = decode_varint(data, 0)
+        for _ in range(member_count):
+            (name_size, position) = decode_varint(data, position)
+            name = data[position:position + name_size].decode('utf-8')
+            position += name_size
+            (offset, position) = decode_varint(data, position)
+            (size, position) = decode_varint(data, position)
+            (original_size, position) = decode_varint(data, position)
+            members.append(ArchiveMember(name, offset, size, original_size))
+    except (IndexError, UnicodeDecodeError):
+        raise InvalidArchive("Given archive has an invalid table of contents")
+
+    return (members, toc_offset)
+
+
+def build_table_of_contents(members: list, toc_offset: int):
+    """
+    Builds the table of contents and the trailer of the archive
+
+    :param members: members of the archive
+    :type members: list
+    :param toc_offset: position of the table of contents in the archive
+    :type toc_offset: int
+    :return: table of contents followed by the trailer
+    :rtype: bytes
+    """
+    table = bytearray(encode_varint(len(members)))
+    for member in members:
+        name = member.name.encode('utf-8')
+        table += encode_varint(len(name)) + name
+        table += encode_varint(member.offset)
+        table += encode_varint(member.size)
+        table += encode_varint(member.original_size)
+    return bytes(table) + toc_offset.to_bytes(ARCHIVE_OFFSET_SIZE, 'big') + ARCHIVE_MAGIC
+
+
+def add_to_archive(archive: str, files: list, workers: int = None):
+    """
+    Compresses the files and adds them to the archive, creating it if it does not exist. Only the table of contents
+    is rewritten, the members already in the archive are kept as they are. A file whose name is already in the
+    archive replaces the previous member.
+
+    :param archive: archive file
+    :type archive: str
+    :param files: files to be compressed
+    :type files: list
+    :param workers: number of processes compressing files at the same time (one per CPU by default)
+    :type workers: int
+    :return: members added to the archive
+    :rtype: list
+    """
+    # everything is compressed before touching the archive, so that a failure cannot leave it half written
+    compressed = _map(_compress_member, files, workers)
+
+    if os.path.exists(archive):
+        (members, toc_offset) = read_table_of_contents(archive)
+        mode = 'r+b'
+    else:
+        (members, toc_offset) = (list(), len(ARCHIVE_MAGIC))
+        mode = 'w+b'
+
+    added = list()
+    with open(archive, mode) as archive_file:
+        if mode == 'w+b':
+            archive_file.write(ARCHIVE_MAGIC)
+
+        # the new members overwrite the previous table of contents
+        archive_file.seek(toc_offset)
+        for (file, data, original_size) in compressed:
+            name = member_name(file)
+            member = ArchiveMember(name, archive_file.tell(), len(data), original_size)
+            archive_file.write(data)
+            members = [m for m in members if m.name != name] + [member]
+            added.append(member)
+
+        archive_file.write(build_table_of_contents(
+            members, archive_file.tell()))
+        archive_file.truncate()
+
+    return added
+
+
+def extract_archive(archive: str, directory: str, names: list = None, workers: int = None):
+    """
+    Decompresses the members of the archive into the directory, keeping their relative paths
+
+    :param archive: archive file
+    :type archive: str
+    :param directory: directory to which the members are written
+    :type directory: str
+    :param names: names of the members to be extracted (all of them by default)
+    :type names: list
+    :param workers: number of processes decompressing members at the same time (one per CPU by default)
+    :type workers: int
+    :return: paths of the extracted files
+    :rtype: list
+    :raises MemberNotFound: if one of the names is not in the archive
+    """
+    (members, _) = read_table_of_contents(archive)
+    if names:
+        by_name = {member.name: member for member in members}
+        missing = [name for name in names if name not in by_name]
+        if missing:
+            raise MemberNotFound(
+                "Members not found in the archive: %s" % (', '.join(missing)))
+        members = [by_name[name] for name in names]
+
+    jobs = [(archive, member, directory) for member in members]
+    return _map(_extract_member, jobs, workers)
+
+
+def _map(function, jobs: list, workers: int = None):
+    """
+    Runs the function on every job, in parallel processes if there is more than one job and worker
+
+    :return: results in the order of the jobs
+    :rtype: list
+    """
+    if workers == 1 or len(jobs) <= 1:
+        return list(map(function, jobs))
+
+    # the process pool is only loaded when it is used, not on every call of project.py
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(function, jobs))
+
+
+def _compress_member(file: str):
+    """
+    Reads and compresses a file to be added to the archive (runs in the worker processes)
+
+    :return: file, content of the compressed member and size of the original file
+    :rtype: tuple
+    """
+    with open(file, 'r', encoding='utf-8', newline='') as input_file:
+        try:
+            text = input_file.read()
+        except UnicodeDecodeError:
+            raise NotCompressable(
+                "Only utf-8 encoded files are compressable")
+
+    # an empty file is stored as a header without symbols, which decompresses to an empty text
+    if not text:
+        return (file, encode_varint(0), 0)
+
+    return (file, compress_text(text), len(text.encode('utf-8')))
+
+
+def _extract_member(job: tuple):
+    """
+    Reads a member from the archive and writes it decompressed (runs in the worker processes)
+
+    :param job: archive file, member to be extracted and output directory
+    :type job: tuple
+    :return: path of the extracted file
+    :rtype: str
+    :raises InvalidArchive: if the member name leads outside of the output directory or the member is corrupt
+    """
+    (archive, member, directory) = job
+
+    # a member name must never lead outside of the directory
+    path = os.path.normpath(os.path.join(directory, member.name))
+    if os.path.isabs(member.name) or os.path.relpath(path, directory).startswith(os.pardir):
+        raise InvalidArchive("Invalid member name: %s" % (member.name))
+
+    with open(archive, 'rb') as archive_file:
+        archive_file.seek(member.offset)
+        data = archive_file.read(member.size)
+
+    # a corrupt member fails anywhere in the decoding (header, padding, codes or utf-8 of a stored text)
+    try:
+        text = decompress_data(data)
+    except (EmptyFile, NoHeader, InvalidPadding, KeyError, IndexError, ValueError):
+        raise InvalidArchive("Corrupt member in the archive: %s" % (member.name))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as output_file:
+        output_file.write(text)
+    return path
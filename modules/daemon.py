@@ -0,0 +1,185 @@
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+
+"""
+Local worker daemon, so that repeated invocations of the compressor skip the interpreter start-up and the
+imports of the compressor modules.
+
+The protocol is a single JSON object per connection: the client sends its command-line arguments and working
+directory, then closes its writing side; the daemon runs the command and answers with its exit status and
+output. This module only depends on the standard library, so that the thin client starts fast.
+"""
+
+# the socket lives in a directory only the current user can write to, so that no other user can put a socket of
+# their own at the same path before the daemon starts
+DAEMON_DIRECTORY = os.environ.get('XDG_RUNTIME_DIR') or os.path.join(
+    tempfile.gettempdir(), 'huffman-%d' % (os.getuid()))
+DAEMON_SOCKET = os.environ.get(
+    'HUFFMAN_SOCKET', os.path.join(DAEMON_DIRECTORY, 'huffman.sock'))
+
+
+class DaemonNotRunning(Exception):
+    pass
+
+
+class UntrustedSocket(DaemonNotRunning):
+    pass
+
+
+def _starts_daemon(argv: list):
+    """
+    Checks if the command-line arguments would start another daemon (--serve, or any abbreviation of it)
+
+    :param argv: command-line arguments, without the program name
+    :type argv: list
+    :return: True if the arguments contain --serve
+    :rtype: bool
+    """
+    for arg in argv:
+        option = arg.split('=')[0]
+        if len(option) > 2 and '--serve'.startswith(option):
+            return True
+    return False
+
+
+def _check_owner(socket_path: str):
+    """
+    Checks that a socket belongs to the current user, and that no other user can replace it
+
+    The directory of the socket must also belong to the current user, unless it is a shared directory like /tmp,
+    owned by root and with the sticky bit, where only the owner of a file can remove it.
+
+    :param socket_path: path of the Unix socket
+    :type socket_path: str
+    :raises UntrustedSocket: if the socket or its directory belong to another user
+    """
+    directory = os.stat(os.path.dirname(socket_path) or os.curdir)
+    if directory.st_uid != os.getuid() and not (directory.st_uid == 0 and directory.st_mode & stat.S_ISVTX):
+        raise UntrustedSocket("The directory of %s belongs to another user" % (socket_path))
+    if os.path.lexists(socket_path) and os.lstat(socket_path).st_uid != os.getuid():
+        raise UntrustedSocket("%s belongs to another user" % (socket_path))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        request = json.loads(self.rfile.read().decode('utf-8'))
+        # a request must not make the daemon serve again, on a socket chosen by the client
+        if _starts_daemon(request['argv']):
+            self.wfile.write(json.dumps({'status': 1, 'stdout': '',
+                                         'stderr': "--serve is not allowed through the daemon\n"}).encode('utf-8'))
+            return
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        status = 0
+        # the server handles one request at a time, so changing the working directory and redirecting the
+        # standard output of the whole process is safe
+        os.chdir(request['cwd'])
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                self.server.run(request['argv'])
+            except SystemExit as exit:
+                if isinstance(exit.code, str):
+                    print(exit.code, file=stderr)
+                    status = 1
+                elif exit.code:
+                    status = exit.code
+            except Exception as error:
+                print("%s: %s" % (type(error).__name__, error), file=stderr)
+                status = 1
+
+        self.wfile.write(json.dumps({'status': status, 'stdout': stdout.getvalue(),
+                                     'stderr': stderr.getvalue()}).encode('utf-8'))
+
+
+def make_server(socket_path: str, run):
+    """
+    Creates the daemon server, bound to a Unix socket only accessible by the current user
+
+    :param socket_path: path of the Unix socket
+    :type socket_path: str
+    :param run: function called with the command-line arguments of each request (e.g. project.main)
+    :type run: callable
+    :return: server ready to serve_forever()
+    :rtype: socketserver.UnixStreamServer
+    :raises UntrustedSocket: if the socket path or its directory belong to another user
+    """
+    directory = os.path.dirname(socket_path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+    _check_owner(socket_path)
+
+    # a socket left behind by a previous daemon would make the bind fail
+    if os.path.lexists(socket_path):
+        os.remove(socket_path)
+
+    # the socket is created with the umask permissions, so it is never accessible by other users, not even until
+    # a chmod after the bind
+    umask = os.umask(0o177)
+    try:
+        server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    finally:
+        os.umask(umask)
+    server.run = run
+    return server
+
+
+def serve(socket_path: str, run):
+    """
+    Serves requests until interrupted or terminated, removing the socket afterwards
+
+    :param socket_path: path of the Unix socket
+    :type socket_path: str
+    :param run: function called with the command-line arguments of each request (e.g. project.main)
+    :type run: callable
+    """
+    server = make_server(socket_path, run)
+    # daemons are usually stopped with SIGTERM, which must also remove the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+
+def send_request(argv: list, socket_path: str = DAEMON_SOCKET):
+    """
+    Sends the command-line arguments to the daemon and waits for the command to finish
+
+    :param argv: command-line arguments, without the program name
+    :type argv: list
+    :param socket_path: path of the Unix socket
+    :type socket_path: str
+    :return: exit status, standard output and standard error of the command
+    :rtype: tuple
+    :raises DaemonNotRunning: if no daemon listens on the socket
+    :raises UntrustedSocket: if the socket belongs to another user, who could read the request and forge the answer
+    """
+    try:
+        _check_owner(socket_path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(socket_path)
+            client.sendall(json.dumps(
+                {'argv': argv, 'cwd': os.getcwd()}).encode('utf-8'))
+            client.shutdown(socket.SHUT_WR)
+
+            response = bytearray()
+            while chunk := client.recv(65536):
+                response += chunk
+    except (FileNotFoundError, ConnectionRefusedError) as error:
+        raise DaemonNotRunning(
+            "No daemon listening on %s.\nHint: Use project.py --serve" % (socket_path)) from error
+
+    response = json.loads(response.decode('utf-8'))
+    return (response['status'], response['stdout'], response['stderr'])
@@ -1,10 +1,13 @@
 # from .classes.node import Node
-from tabulate import tabulate
+from collections import deque, Counter
+from math import ceil, log2
+import codecs
+import heapq
+import io
+import os
+import re
 
 
-HEADER_TERMINATOR = chr(127)
-HEADER_ELEMENT_SEPARATOR = chr(7)
-
 """ 
 The convention adoptet for this module is to treat all the encoding, building, writtig logic in itself, 
 so the user only needs to call the functions after initializing a Huffman object with some encoded or 
@@ -35,6 +38,100 @@ class UnsortedHeap(Exception):
     pass
 
 
+class NotAppendable(Exception):
+    pass
+
+
+def encode_varint(value: int):
+    """
+    Encodes a non-negative integer in a variable number of bytes (LEB128): 7 bits per byte, least significant
+    group first, the highest bit of each byte tells if another byte follows
+
+    :param value: non-negative integer
+    :type value: int
+    :return: encoded integer
+    :rtype: bytes
+    """
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append((value & 0x7f) | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_varint(data: bytes, position: int):
+    """
+    Decodes an integer encoded by encode_varint()
+
+    :param data: data containing the encoded integer
+    :type data: bytes
+    :param position: position of the first byte of the encoded integer
+    :type position: int
+    :return: decoded integer and the position right after it
+    :rtype: tuple
+    :raises IndexError: if the data ends before the integer
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return (value, position)
+        shift += 7
+
+
+def find_bit_pattern(data: bytes, pattern: int, length: int, bit_count: int):
+    """
+    Finds a bit pattern at any bit position of the data, without expanding the data to bits. For each of the 8
+    positions the pattern can start at within a byte, the bytes it covers are searched with a regular expression:
+    bytes fully covered by the pattern are matched literally, the first and last ones with a character class of the
+    byte values whose covered bits match.
+
+    :param data: data to search in
+    :type data: bytes
+    :param pattern: bits to search for, most significant first
+    :type pattern: int
+    :param length: number of bits of the pattern
+    :type length: int
+    :param bit_count: number of bits of the data searched, the bits after it are ignored
+    :type bit_count: int
+    :return: generator of the bit positions of every match (overlapping ones included), in increasing order
+    :rtype: generator
+    """
+    searches = list()
+    for shift in range(8):
+        byte_count = (shift + length + 7) // 8
+        unused = 8 * byte_count - shift - length
+        value = pattern << unused
+        mask = ((1 << length) - 1) << unused
+
+        expression = bytearray()
+        for index in reversed(range(byte_count)):
+            (byte, byte_mask) = ((value >> 8 * index) & 0xff, (mask >> 8 * index) & 0xff)
+            if byte_mask == 0xff:
+                expression += re.escape(bytes([byte]))
+            else:
+                expression += b'[' + b''.join(re.escape(bytes([other])) for other in range(256)
+                                              if other & byte_mask == byte) + b']'
+
+        # a lookahead, so that overlapping matches are found too
+        matches = re.finditer(b'(?=' + bytes(expression) + b')', data)
+        searches.append(_bit_positions(matches, shift))
+
+    for position in heapq.merge(*searches):
+        if position + length > bit_count:
+            return
+        yield position
+
+
+def _bit_positions(matches, shift: int):
+    for match in matches:
+        yield 8 * match.start() + shift
+
+
 class Node:
     def __init__(self, left=None, right=None):
         self._left = left
@@ -48,21 +145,84 @@ class Node:
 
 
 HEADER_MAX_DIGITS = 16
+DECODE_CHUNK_SIZE = 8192
+SEARCH_CONTEXT_SIZE = 20
+
+# appended files: <compressed file><segment>...<segment><segment table><segment table offset><SEGMENT_MAGIC>
+# (see append_to_compressed_file())
+SEGMENT_MAGIC = b'\x00HUFSEG'
+SEGMENT_OFFSET_SIZE = 8
+SEGMENT_NEW_TABLE = 0
+SEGMENT_REUSE_TABLE = 1
+
+
+class _ByteTransitions(dict):
+    """
+    Decoding of a whole byte of huffman encoded text, built lazily, so that the encoded bytes can be walked one byte
+    at a time instead of one bit at a time (see Huffman.search())
+
+    The decoding state between two bytes is the partial codeword read so far, as an integer with a leading 1 bit
+    (so that its leading zeros are kept): 1 when the byte starts on a codeword boundary. The table is indexed by
+    state << 8 | byte, and each entry holds:
+        - the state after the byte
+        - the number of codewords ending in the byte
+        - the bit positions of the byte (0 being the most significant bit) where a codeword starts, as a bit mask
+        - the decoded symbols
+    """
+
+    def __init__(self, decoding_dict: dict):
+        self.leaves = {int('1' + code, 2): symbol for (code, symbol) in decoding_dict.items()}
+
+    def __missing__(self, key: int):
+        (state, byte) = (key >> 8, key & 0xff)
+        starts = 1 if state == 1 else 0
+        symbols = list()
+        for position in range(8):
+            state = state << 1 | (byte >> (7 - position)) & 1
+            if state in self.leaves:
+                symbols.append(self.leaves[state])
+                state = 1
+                starts |= 1 << (position + 1)
+
+        self[key] = (state, len(symbols), starts & 0xff, ''.join(symbols))
+        return self[key]
+
+    def decode_bits(self, state: int, byte: int, bit_count: int):
+        """
+        Decodes only the first bit_count bits of the byte, e.g. the last one, whose other bits are padding bits
+
+        :return: decoded symbols
+        :rtype: str
+        """
+        symbols = list()
+        for position in range(bit_count):
+            state = state << 1 | (byte >> (7 - position)) & 1
+            if state in self.leaves:
+                symbols.append(self.leaves[state])
+                state = 1
+        return ''.join(symbols)
 
 
 class Huffman:
 
     def __init__(self):
         self.symbol_heap = dict()
+        self.code_lengths = dict()
         self.encoding_dict = dict()
         self.decoding_dict = dict()
-        self.header = str()
+        self.header = bytes()
         self.header_size = int()
         self.decoded_text = str()
         self.byte_array = bytearray()
         self.encoded_text = str()
         self.tree = Node()
         self.padding_count = int()
+        self.stored = False
+        # appended files (see append_to_compressed_file()): one object per segment, each decoded on its own
+        self.segments = list()
+        # set by the search of a segment, for the search of the next ones (see Huffman.__search_segments__())
+        self.symbol_count = int()
+        self.last_symbols = str()
 
     @property
     def symbol_heap(self):
@@ -74,6 +234,17 @@ class Huffman:
             raise ValueError("Invalid list (None)")
         self._symbol_heap = symbol_heap
 
+    @property
+    def code_lengths(self):
+        return self._code_lengths
+
+    @code_lengths.setter
+    def code_lengths(self, code_lengths):
+        if code_lengths == None:
+            raise ValueError(
+                "Invalid code lengths (None)")
+        self._code_lengths = code_lengths
+
     @property
     def encoding_dict(self):
         return self._encoding_dict
@@ -159,6 +330,17 @@ class Huffman:
                 "Invalid header size")
         self._padding_count = padding_count
 
+    @property
+    def stored(self):
+        return self._stored
+
+    @stored.setter
+    def stored(self, stored):
+        if stored == None:
+            raise ValueError(
+                "Invalid storage mode")
+        self._stored = stored
+
     def build_symbol_heap(self):
         """
         Builds a frequency table (MinHeap) based on the symbols encountered in the decoded text
@@ -170,13 +352,11 @@ class Huffman:
             :self.decoded_text: str
             :symbol_heap: dict
         """
-        # iterate through the message in the provided file (or as input on command-line) to count the most frequent symbols
-        for symbol in self.decoded_text:
+        # count the symbols of the message in the provided file (or as input on command-line) at once, the counting is
+        # done in C, so it stays fast even for large alphabets
+        for (symbol, freq) in Counter(self.decoded_text).items():
             # add the symbols and its frequency to the list, so that we can access them later to create the huffman's tree
-            if symbol in self.symbol_heap:
-                self.symbol_heap[symbol] += 1
-            else:
-                self.symbol_heap[symbol]: int = 1
+            self.symbol_heap[symbol] = self.symbol_heap.get(symbol, 0) + freq
 
     def build_tree(self):
         """
@@ -198,27 +378,38 @@ class Huffman:
             raise UnsortedHeap(
                 "The given frequency needs to be initially sorted.\nHint: Use the method Huffman.sort_symbol_heap()")
 
-        symbol_heap: list() = self.symbol_heap
+        # a real min-heap, so that each merge costs O(log n) instead of resorting the whole list, which matters
+        # for alphabets with thousands of symbols. The insertion order breaks ties between equal frequencies
+        symbol_heap = [(freq, order, sym)
+                       for (order, (sym, freq)) in enumerate(self.symbol_heap)]
+        heapq.heapify(symbol_heap)
+        order = len(symbol_heap)
 
         while len(symbol_heap) > 1:
-            # get the two least frequent symbols of the list to build the tree
-            (sym1, freq1) = symbol_heap[-1]
-            (sym2, freq2) = symbol_heap[-2]
-
-            # remove them after the acquisition because we will turn the symbols into nodes
-            symbol_heap = symbol_heap[:-2]
+            # get (and remove) the two least frequent symbols of the list to build the tree
+            (freq1, _, sym1) = heapq.heappop(symbol_heap)
+            (freq2, _, sym2) = heapq.heappop(symbol_heap)
 
             # build the node of the self.symbol_heap
             node = Node((sym1, freq1), (sym2, freq2))
 
             # add node to the self.symbol_heap
-            symbol_heap.append((node, freq1 + freq2))
+            heapq.heappush(symbol_heap, (freq1 + freq2, order, node))
+            order += 1
 
-            # resort the tree, so that the tree stays updated
-            symbol_heap = sorted(
-                symbol_heap, key=lambda n: n[1], reverse=True)
+        self.tree = symbol_heap[0][2]
+
+    def build_code_tables(self):
+        """
+        Builds the Huffman Tree, the code lengths and the canonical encoding dict
 
-        self.tree = symbol_heap[0][0]
+        :raise ValueError: if frequency table is empty
+        :raise UnsortedHeap: if frequency table is not sorted
+        """
+        self.build_tree()
+        self.build_encoding_dict()
+        self.build_code_lengths()
+        self.build_canonical_encoding_dict()
 
     def build_encoding_dict(self):
         """
@@ -274,6 +465,49 @@ class Huffman:
 
         return encoded
 
+    def build_code_lengths(self):
+        """
+        Gets the length of the code of each symbol from the encoding dict built from the Huffman Tree
+
+        :raise ValueError: if the encoding dict was not built yet
+        """
+        if not self.encoding_dict:
+            raise ValueError(
+                "Given encoding dictionary is empty.\nHint: Use the method Huffman.build_encoding_dict()")
+
+        self.code_lengths = {symbol: len(code)
+                             for (symbol, code) in self.encoding_dict.items()}
+
+    def build_canonical_encoding_dict(self):
+        """
+        Builds the canonical encoding dict from the code lengths: the symbols are sorted by code length and then by
+        code point, and each one gets the next binary number, shifted left whenever the code length grows.
+
+        The codes keep the lengths given by the Huffman Tree (so the compression is the same), but they can be
+        rebuilt from the lengths alone, which is what the header stores.
+
+        Example:
+            {'a': 2, 'b': 2, 'c': 2, 'd': 3, 'e': 3}
+            Gets converted to:
+            {'a': '00', 'b': '01', 'c': '10', 'd': '110', 'e': '111'}
+
+        :raise ValueError: if there are no code lengths
+        """
+        if not self.code_lengths:
+            raise ValueError(
+                "No code lengths supplied.\nHint: Use the method Huffman.build_code_lengths()")
+
+        encoding_dict = dict()
+        code = 0
+        previous_length = 0
+        for (symbol, length) in sorted(self.code_lengths.items(), key=lambda l: (l[1], l[0])):
+            code <<= length - previous_length
+            encoding_dict[symbol] = format(code, '0%db' % (length))
+            code += 1
+            previous_length = length
+
+        self.encoding_dict = encoding_dict
+
     def build_decoding_dict_from_encoding_dict(self):
         """
         Once the encoding dict is built, build the decoding dict (i.e.: value becomes key and previous key becomes value)
@@ -296,40 +530,56 @@ class Huffman:
 
     def build_header(self):
         """
-        Creates the header to the encoded file.
+        Creates the header to the encoded file. All the numbers are varints (see encode_varint()), and the symbols
+        are sorted by code point, so that only the difference to the previous code point is stored.
         Header format:
-            <symbol><occurences><HEADER_ELEMENT_SEPARATOR>...<symbol><occurences><HEADER_ELEMENT_SEPARATOR><HEADER_TERMINATOR>
+            <symbol count><code point delta><code length>...<code point delta><code length>
 
+        A symbol count of 0 means that the text is stored raw (see Huffman.write_stored_text_to_file())
 
         :param self:
-            :self.symbol_heap: necessary to build the dictionary
+            :self.code_lengths: necessary to rebuild the canonical encoding dict
         :type self: Huffman
-            :self.symbol_heap: dict
-        :raise ValueError: if the encoding dict was not built yet
+            :self.code_lengths: dict
+        :raise ValueError: if the code lengths were not built yet
         """
+        if not self.code_lengths:
+            raise ValueError(
+                "No code lengths supplied.\nHint: Use the method Huffman.build_code_tables()")
 
-        table = str()
-        for (char, freq) in self.symbol_heap:
-            table += char + str(freq) + HEADER_ELEMENT_SEPARATOR
-        self.header = table + HEADER_TERMINATOR
+        header = bytearray(encode_varint(len(self.code_lengths)))
+        previous_code_point = 0
+        for (symbol, length) in sorted(self.code_lengths.items()):
+            header += encode_varint(ord(symbol) - previous_code_point)
+            header += encode_varint(length)
+            previous_code_point = ord(symbol)
+        self.header = bytes(header)
 
-    def build_heap_from_header(self):
+    def build_code_lengths_from_header(self, data: bytes):
         """
-        Builds frequency table from header
+        Reads the header at the beginning of the data in a single linear scan, recovering the code lengths
         Header format:
-            <symbol><occurences><HEADER_ELEMENT_SEPARATOR>...<symbol><occurences><HEADER_ELEMENT_SEPARATOR><HEADER_TERMINATOR>
+            <symbol count><code point delta><code length>...<code point delta><code length>
 
-        :param self:
-            :self.header: contains the list with separator
-        :type self: Huffman
-            :self.header: str
-        :raise ValueError: if the header has invalid format
+        :param data: content of the compressed file
+        :type data: bytes
+        :return: position of the first byte after the header
+        :rtype: int
+        :raise NoHeader: if the header has invalid format
         """
-        header_element_list = list()
-        header_element_list = self.header.split(HEADER_ELEMENT_SEPARATOR)
-        header_element_list.pop()
-        for element in header_element_list:
-            self.symbol_heap[element[0]] = int(element[1:])
+        try:
+            (symbol_count, position) = decode_varint(data, 0)
+            code_point = 0
+            for _ in range(symbol_count):
+                (delta, position) = decode_varint(data, position)
+                (length, position) = decode_varint(data, position)
+                code_point += delta
+                self.code_lengths[chr(code_point)] = length
+        except (IndexError, ValueError, OverflowError):
+            raise NoHeader("Given compressed file has no valid table header")
+
+        self.header = data[:position]
+        return position
 
     def build_encoded_text(self):
         """
@@ -344,8 +594,8 @@ class Huffman:
         if not self.decoded_text:
             raise EmptyFile
 
-        for char in self.decoded_text:
-            self.encoded_text += self.encoding_dict[char]
+        self.encoded_text += ''.join(map(self.encoding_dict.__getitem__,
+                                         self.decoded_text))
 
     def sort_symbol_heap(self):
         """
@@ -361,84 +611,222 @@ class Huffman:
         self.symbol_heap = sorted(self.symbol_heap.items(),
                                   key=lambda l: l[1], reverse=True)
 
-    def get_byte_list(self):
+    def estimate_encoded_size(self):
         """
-        Converts the binary encoded text into real bytes
+        Estimates the size of the compressed file from the frequency table, without building the tree.
+        The payload is estimated through the entropy of the symbols, which is the lower bound of the huffman
+        encoding (in bits per symbol).
 
-        Example: 
-            01011101101011010101010111
-            Gets converted to:
-            [93, 173, 87]
+        :return: estimated size in bytes of header + payload + padding information
+        :rtype: int
+        :raises ValueError: if an empty frequency table is provided
+        """
+        if not self.symbol_heap:
+            raise ValueError(
+                "Cannot estimate the size from an empty frequency table.\nHit: Use the method Huffman.build_symbol_heap()")
+
+        symbol_heap = dict(self.symbol_heap)
+        total = sum(symbol_heap.values())
+        entropy = -sum(freq / total * log2(freq / total)
+                       for freq in symbol_heap.values())
+
+        # <symbol count>, then <code point delta><code length> for every symbol (see Huffman.build_header()),
+        # a code length always fits in a single varint byte
+        header_size = len(encode_varint(len(symbol_heap)))
+        previous_code_point = 0
+        for code_point in sorted(map(ord, symbol_heap)):
+            header_size += len(encode_varint(code_point -
+                               previous_code_point)) + 1
+            previous_code_point = code_point
+
+        return header_size + ceil(total * entropy / 8) + 1
+
+    def is_compressible(self):
+        """
+        Decides if the huffman encoding pays off, comparing the compressed size to the size of storing the text raw.
+
+        The entropy estimate is a lower bound, and the huffman codes are less than 1 bit per symbol longer than the
+        entropy, so only when the stored size falls between both bounds the code tables are built, on a copy of the
+        frequency table, to get the exact compressed size (see Huffman.compute_compressed_size()).
+
+        :return: False if the text should be stored instead of encoded
+        :rtype: bool
+        """
+        # a tree cannot be built from a single symbol
+        if len(self.symbol_heap) < 2:
+            return False
+
+        stored_size = self.compute_stored_size()
+        estimated_size = self.estimate_encoded_size()
+        if estimated_size >= stored_size:
+            return False
+        if estimated_size + ceil(sum(dict(self.symbol_heap).values()) / 8) < stored_size:
+            return True
+
+        huffman = Huffman()
+        huffman.symbol_heap = dict(self.symbol_heap)
+        huffman.sort_symbol_heap()
+        huffman.build_code_tables()
+        huffman.build_header()
+        return huffman.compute_compressed_size() < stored_size
+
+    def compute_compressed_size(self):
+        """
+        Computes the exact size of the compressed file from the frequency table and the code lengths, without encoding
+        the text: the header, the sum of occurences x code length bits rounded up to whole bytes by the padding,
+        and the padding information
 
         :param self:
-            :self.encoded_text: array that contains the huffman encoded text
-            :self.byte_array: array that contains the converted list
+            :self.symbol_heap: frequency table
+            :self.code_lengths: code lengths built with Huffman.build_code_tables()
+            :self.header: header built with Huffman.build_header()
         :type self: Huffman
-            :self.encoded_text: str
-            :self.byte_array: bitearray 
+        :return: size in bytes of the compressed file
+        :rtype: int
+        :raises ValueError: if there is no frequency table or no code lengths
+        """
+        if not self.symbol_heap:
+            raise ValueError(
+                "Cannot compute the size from an empty frequency table.\nHit: Use the method Huffman.build_symbol_heap()")
+        if not self.code_lengths:
+            raise ValueError(
+                "No code lengths supplied.\nHint: Use the method Huffman.build_code_tables()")
+
+        bit_count = sum(freq * self.code_lengths[symbol]
+                        for (symbol, freq) in dict(self.symbol_heap).items())
+        return len(self.header) + ceil(bit_count / 8) + 1
+
+    def compute_stored_size(self):
         """
-        # by convention, the first char of a 8-char group will be on the left
-        for i in range(0, len(self.encoded_text), 8):
-            byte = int(self.encoded_text[i:i+8], 2)
-            self.byte_array.append(byte)
+        Computes the size of the file if the text is stored raw (see Huffman.write_stored_text_to_file())
+
+        :return: size in bytes of the stored file
+        :rtype: int
+        """
+        return len(encode_varint(0)) + len(self.decoded_text.encode('utf-8'))
 
     def parse_uncompressed_file(self, file: str):
         """
         Reads file and gets its text
 
         :raises EmptyFile:
-        :raises NotCompressable: if text is not ascii(utf8) text
+        :raises NotCompressable: if text is not utf-8 text
         """
-        with open(file, 'r', encoding='utf-8') as input_file:
+        # newlines are not translated, so that the text and its size in bytes match the file (see --append)
+        with open(file, 'r', encoding='utf-8', newline='') as input_file:
             # read everything at once. This way there are less function calls in comparison to as if one would read line by line
-            self.decoded_text = input_file.read()
+            try:
+                self.decoded_text = input_file.read()
+            except UnicodeDecodeError:
+                raise NotCompressable(
+                    "Only utf-8 encoded files are compressable")
 
             if not self.decoded_text:
                 raise EmptyFile("Cannot compress empty file")
-            if not self.decoded_text.isascii():
-                raise NotCompressable(
-                    "Only extended-ascii/utf8 encoded files are compressable")
 
     def parse_compressed_file(self, file: str):
         """
-        Reads compressed file, decodes the header, recovers the frequency table and the huffman encoded text 
+        Reads compressed file, decodes the header, recovers the code lengths and the huffman encoded text 
 
         :raises EmptyFile:
         :raises NoHeader:
         """
-        tmp = list()
+        self.parse_compressed_header(file)
+        if self.stored:
+            return
+        if self.segments:
+            self.decoded_text = decode_segments(self.segments)
+            return
+
+        self.recover_bin_encoded_text()
+        self.encoded_text = self.encoded_text[: -(self.padding_count+8)]
+
+    def parse_compressed_header(self, file: str):
+        """
+        Reads compressed file, decodes the header and recovers the code lengths and padding, but keeps the
+        huffman encoded text as raw bytes in self.byte_array, so that it can be decoded lazily with Huffman.iter_decode()
+
+        A stored file (no symbols in the header) has its raw text copied straight to self.decoded_text
+
+        :raises EmptyFile:
+        :raises NoHeader:
+        :raises InvalidPadding:
+        """
         with open(file, 'rb') as input_file:
-            tmp = input_file.read().split(
-                str.encode(HEADER_TERMINATOR), maxsplit=1)
+            self.parse_compressed_data(input_file.read())
 
-            if not tmp:
-                raise EmptyFile("Cannot decompress empty file")
+    def parse_compressed_data(self, data: bytes):
+        """
+        Same as Huffman.parse_compressed_header(), but from the content of a compressed file already in memory
 
-            self.header = tmp[0].decode()
+        :raises EmptyFile:
+        :raises NoHeader:
+        :raises InvalidPadding:
+        """
+        if not data:
+            raise EmptyFile("Cannot decompress empty file")
 
-            if not self.header:
-                raise NoHeader(
-                    "Given compressed file has no valid table header")
+        # the segments of an appended file are kept apart, so that they can still be decoded lazily
+        segments = read_segment_table(io.BytesIO(data))
+        if segments != None:
+            self.segments = open_segments(data, segments)
+            return
 
-            self.byte_array = tmp[1]
+        self.parse_segment_data(data)
+
+    def parse_segment_data(self, data: bytes):
+        """
+        Same as Huffman.parse_compressed_data(), for a compressed file without appended segments, or for one
+        segment with a code table of an appended file
 
-        self.build_heap_from_header()
+        :raises NoHeader:
+        :raises InvalidPadding:
+        """
+        position = self.build_code_lengths_from_header(data)
+
+        if not self.code_lengths:
+            self.stored = True
+            self.decoded_text = data[position:].decode('utf-8')
+            return
+
+        # at least one byte of encoded text and the padding information
+        if len(data) - position < 2:
+            raise NoHeader(
+                "Given compressed file has no valid table header")
+
+        self.parse_encoded_bytes(data[position:])
+
+    def parse_encoded_bytes(self, data: bytes):
+        """
+        Gets the huffman encoded text in bytes and the padding information, i.e. everything after the header
+
+        :raises InvalidPadding:
+        """
+        self.byte_array = data
         self.padding_count = int(chr(self.byte_array[-1]))
         if self.padding_count >= 8:
             raise InvalidPadding(
                 "The acquired padding (%d bits) is not possible" % (self.padding_count))
-        self.recover_bin_encoded_text()
-        self.encoded_text = self.encoded_text[: -(self.padding_count+8)]
 
     def recover_bin_encoded_text(self):
         """
         From the bytearray object gotten from the file, recover the encoded huffman message 
         """
 
-        for ch in self.byte_array:
-            # Converts byte to str, removes the 0b in the beginning and padds the converted value with 8,
-            # so that the zeros are not lost in the bin conversion.
-            self.encoded_text += bin(ch).replace('0b', '').zfill(8)
+        # Converts each byte to str, padded with zeros to 8 digits so that the zeros are not lost in the bin conversion.
+        # The pieces are joined at once, appending to the attribute would copy the whole text for every byte
+        self.encoded_text += ''.join(format(ch, '08b')
+                                     for ch in self.byte_array)
+
+    def build_decoded_text_from_byte_array(self):
+        """
+        Decodes the bytes acquired with Huffman.parse_encoded_bytes(), rebuilding the codes from the code lengths
+        """
+        self.recover_bin_encoded_text()
+        self.encoded_text = self.encoded_text[: -(self.padding_count+8)]
+        self.build_canonical_encoding_dict()
+        self.build_decoding_dict_from_encoding_dict()
+        self.build_decoded_text()
 
     def build_decoded_text(self):
         """
@@ -454,14 +842,336 @@ class Huffman:
             raise ValueError(
                 "No decoding dictionary supplied.\nHint: Use the method Huffman.build_decoding_dict_from_encoding_dict()")
 
+        decoded_symbols = list()
         moving_window = str()
         for ch in self.encoded_text:
             if moving_window in self.decoding_dict:
-                self.decoded_text += self.decoding_dict[moving_window]
+                decoded_symbols.append(self.decoding_dict[moving_window])
                 moving_window = str()
             moving_window += ch
 
-        self.decoded_text += self.decoding_dict[moving_window]
+        decoded_symbols.append(self.decoding_dict[moving_window])
+        self.decoded_text += ''.join(decoded_symbols)
+
+    def iter_decode(self, chunk_size: int = DECODE_CHUNK_SIZE):
+        """
+        Lazily decodes the raw bytes acquired with Huffman.parse_compressed_header(), yielding the decoded text in
+        chunks of at most chunk_size symbols. The bits are expanded one byte at a time, so the consumer can stop 
+        early without paying for the full decode nor holding the whole decoded text in memory.
+
+        :param chunk_size: maximum number of symbols yielded at once
+        :type chunk_size: int
+        :raises ValueError: if no encoded bytes or no decoding dictionary are supplied, or if chunk_size is not positive
+        """
+        if chunk_size < 1:
+            raise ValueError("Chunk size must be a positive number")
+        if self.segments:
+            for segment in self.segments:
+                yield from segment.iter_decode(chunk_size)
+            return
+        if self.stored:
+            for i in range(0, len(self.decoded_text), chunk_size):
+                yield self.decoded_text[i:i + chunk_size]
+            return
+        if not self.byte_array:
+            raise ValueError(
+                "No huffman encoded bytes supplied.\nHint: Use the method Huffman.parse_compressed_header()")
+        if not self.decoding_dict:
+            raise ValueError(
+                "No decoding dictionary supplied.\nHint: Use the method Huffman.build_decoding_dict_from_encoding_dict()")
+
+        # the last byte holds the padding information, the one before it holds the padding bits
+        last_index = len(self.byte_array) - 2
+        chunk = list()
+        moving_window = str()
+        for index in range(last_index + 1):
+            bits = format(self.byte_array[index], '08b')
+            if index == last_index:
+                bits = bits[:8 - self.padding_count]
+
+            for bit in bits:
+                moving_window += bit
+                if moving_window in self.decoding_dict:
+                    chunk.append(self.decoding_dict[moving_window])
+                    moving_window = str()
+                    if len(chunk) >= chunk_size:
+                        yield ''.join(chunk)
+                        chunk = list()
+
+        if chunk:
+            yield ''.join(chunk)
+
+    def iter_lines(self, chunk_size: int = DECODE_CHUNK_SIZE):
+        """
+        Lazily decodes the raw bytes acquired with Huffman.parse_compressed_header(), yielding one line at a time
+        (line terminators are kept, as in io.IOBase.readlines())
+
+        :param chunk_size: number of symbols decoded before looking for line terminators
+        :type chunk_size: int
+        """
+        # only the new chunk is split, the pieces of an unfinished line are joined once its terminator arrives
+        pending = list()
+        for chunk in self.iter_decode(chunk_size):
+            lines = chunk.split('\n')
+            if len(lines) == 1:
+                pending.append(chunk)
+                continue
+
+            pending.append(lines[0])
+            yield ''.join(pending) + '\n'
+            for line in lines[1:-1]:
+                yield line + '\n'
+            pending = [lines[-1]]
+
+        last_line = ''.join(pending)
+        if last_line:
+            yield last_line
+
+    def search(self, pattern: str, context: int = SEARCH_CONTEXT_SIZE):
+        """
+        Searches a literal pattern directly in the huffman encoded bytes acquired with Huffman.parse_compressed_header(),
+        yielding every match without decoding the whole text.
+
+        Since each symbol always has the same code, the pattern is encoded once and its bit sequence is searched in
+        the encoded bytes, at any bit position (see find_bit_pattern()). A bit match is only a real match if it starts
+        on a codeword boundary, so the codeword boundaries are walked a whole byte at a time with a lookup table (see
+        _ByteTransitions), only up to the candidates found. The bytes are never expanded to bits, and only the context
+        around each match is decoded.
+
+        :param pattern: literal text to search for
+        :type pattern: str
+        :param context: number of symbols decoded before and after each match
+        :type context: int
+        :return: generator of (symbol offset of the match, decoded context around the match)
+        :rtype: generator
+        :raises ValueError: if the pattern is empty, the context is negative, or if no encoded bytes or no decoding
+            dictionary are supplied
+        """
+        if not pattern:
+            raise ValueError("Cannot search for an empty pattern")
+        if context < 0:
+            raise ValueError("The search context cannot be negative")
+        if self.segments:
+            yield from self.__search_segments__(pattern, context)
+            return
+        if self.stored:
+            yield from self.__search_stored_text__(pattern, context)
+            return
+        if not self.byte_array:
+            raise ValueError(
+                "No huffman encoded bytes supplied.\nHint: Use the method Huffman.parse_compressed_header()")
+        if not self.decoding_dict:
+            raise ValueError(
+                "No decoding dictionary supplied.\nHint: Use the method Huffman.build_decoding_dict_from_encoding_dict()")
+
+        yield from self.__search_encoded_text__(pattern, context)
+
+    def __search_encoded_text__(self, pattern: str, context: int, last_symbol_count: int = None):
+        """
+        Searches a literal pattern in the huffman encoded bytes (see Huffman.search())
+
+        :param last_symbol_count: if given, the codeword boundaries are walked to the end after the last match, to set
+            self.symbol_count and self.last_symbols (the last last_symbol_count symbols)
+        :type last_symbol_count: int
+        :return: generator of (symbol offset of the match, decoded context around the match)
+        :rtype: generator
+        """
+        # the last byte holds the padding information, the one before it holds the padding bits
+        payload = self.byte_array[:-1]
+        bit_count = 8 * len(payload) - self.padding_count
+        transitions = _ByteTransitions(self.decoding_dict)
+
+        # the symbols before a match are decoded from a recent byte whose decoding state is known. The last bytes
+        # walked hold at least that many complete codewords, however long the codes are
+        max_code_length = max(len(code) for code in self.decoding_dict)
+        checkpoints = deque(
+            maxlen=(max(context, last_symbol_count or 0) * max_code_length) // 8 + 2)
+
+        # a symbol that never occurs in the text cannot be matched
+        if any(symbol not in self.encoding_dict for symbol in pattern):
+            candidates = iter(())
+        else:
+            pattern_bits = ''.join(self.encoding_dict[symbol] for symbol in pattern)
+            candidates = find_bit_pattern(payload, int(pattern_bits, 2), len(pattern_bits), bit_count)
+
+        byte_index = 0
+        # partial codeword at the start of payload[byte_index] (see _ByteTransitions), and codewords before it
+        state = 1
+        symbol_offset = 0
+        for candidate in candidates:
+            target = candidate >> 3
+            if byte_index < target:
+                (state, symbol_offset) = self.__walk_bytes__(
+                    payload, byte_index, target, state, symbol_offset, checkpoints, transitions)
+                byte_index = target
+
+            # a bit match is only a real match if a codeword starts where it starts
+            starts = transitions[state << 8 | payload[target]][2]
+            bit = candidate & 7
+            if not starts >> bit & 1:
+                continue
+
+            # codewords ending inside the byte, before the candidate
+            offset = symbol_offset + bin(starts & ((2 << bit) - 2)).count('1')
+            first = max(offset - context, 0)
+            checkpoint = (target, state, symbol_offset)
+            if symbol_offset > first:
+                checkpoint = next(checkpoint for checkpoint in reversed(checkpoints)
+                                  if checkpoint[2] <= first)
+            yield (offset, self.__decode_symbols__(payload, checkpoint, first, offset + len(pattern) + context,
+                                                   bit_count, transitions))
+
+        if last_symbol_count == None:
+            return
+
+        # the last byte is the only one holding padding bits
+        last_index = len(payload) - 1
+        (state, symbol_offset) = self.__walk_bytes__(
+            payload, byte_index, last_index, state, symbol_offset, checkpoints, transitions)
+        checkpoints.append((last_index, state, symbol_offset))
+        self.symbol_count = symbol_offset + len(transitions.decode_bits(
+            state, payload[last_index], bit_count - 8 * last_index))
+
+        first = max(self.symbol_count - last_symbol_count, 0)
+        checkpoint = next(checkpoint for checkpoint in reversed(checkpoints)
+                          if checkpoint[2] <= first)
+        self.last_symbols = self.__decode_symbols__(
+            payload, checkpoint, first, self.symbol_count, bit_count, transitions)
+
+    def __walk_bytes__(self, payload: bytes, start: int, stop: int, state: int, symbol_offset: int, checkpoints: deque,
+                       transitions):
+        """
+        Walks the codeword boundaries a whole byte at a time, from payload[start] to payload[stop] (excluded). Only
+        the last bytes are kept as checkpoints (see Huffman.__decode_symbols__())
+
+        :param state: partial codeword at the start of payload[start] (see _ByteTransitions)
+        :type state: int
+        :param symbol_offset: number of codewords before payload[start]
+        :type symbol_offset: int
+        :return: partial codeword at the start of payload[stop] and number of codewords before it
+        :rtype: tuple
+        """
+        checkpoint_start = max(start, stop - checkpoints.maxlen)
+        for byte in payload[start:checkpoint_start]:
+            (state, count, _, _) = transitions[state << 8 | byte]
+            symbol_offset += count
+        for index in range(checkpoint_start, stop):
+            checkpoints.append((index, state, symbol_offset))
+            (state, count, _, _) = transitions[state << 8 | payload[index]]
+            symbol_offset += count
+        return (state, symbol_offset)
+
+    def __search_segments__(self, pattern: str, context: int):
+        """
+        Searches a literal pattern in the segments of an appended file, one after the other. The matches inside a
+        segment are searched in the segment alone, with its own code table. Only the symbols around the boundaries
+        between segments are decoded, to find the matches spanning a boundary and to complete the contexts cut by one.
+
+        :return: generator of (symbol offset of the match, decoded context around the match)
+        :rtype: generator
+        """
+        # symbols needed on each side of a boundary: a match spanning it, and its context
+        keep = len(pattern) - 1 + context
+        # codewords in the segments before the current one, and the last keep symbols of these segments
+        symbol_offset = 0
+        previous_symbols = str()
+        # matches waiting for the symbols after them, in order: [offset, context around the match, missing symbols]
+        pending = deque()
+
+        last_index = len(self.segments) - 1
+        for (index, segment) in enumerate(self.segments):
+            first_symbols = next(segment.iter_decode(keep), str()) if keep else str()
+            for match in pending:
+                match[1] += first_symbols[:match[2]]
+                match[2] -= min(match[2], len(first_symbols))
+
+            # matches starting in the previous segments and ending in this one
+            text = previous_symbols + first_symbols
+            start = text.find(pattern, max(len(previous_symbols) - len(pattern) + 1, 0))
+            while start != -1 and start < len(previous_symbols):
+                end = start + len(pattern) + context
+                pending.append([symbol_offset - len(previous_symbols) + start, text[max(start - context, 0):end],
+                                max(end - len(text), 0)])
+                start = text.find(pattern, start + 1)
+
+            # matches inside the segment, whose context may go on in the previous and next segments
+            if segment.stored:
+                matches = segment.__search_stored_text__(pattern, context)
+            else:
+                matches = segment.__search_encoded_text__(
+                    pattern, context, keep if index < last_index else None)
+            for (offset, found) in matches:
+                end = offset + len(pattern) + context
+                missing = end - max(offset - context, 0) - len(found)
+                if offset < context:
+                    found = previous_symbols[max(len(previous_symbols) - context + offset, 0):] + found
+                pending.append([symbol_offset + offset, found, missing])
+                while pending and not pending[0][2]:
+                    (match_offset, found, _) = pending.popleft()
+                    yield (match_offset, found)
+
+            while pending and not pending[0][2]:
+                (match_offset, found, _) = pending.popleft()
+                yield (match_offset, found)
+
+            if index == last_index:
+                break
+            if segment.stored:
+                segment.symbol_count = len(segment.decoded_text)
+                segment.last_symbols = segment.decoded_text[max(segment.symbol_count - keep, 0):]
+            previous_symbols += segment.last_symbols
+            previous_symbols = previous_symbols[max(len(previous_symbols) - keep, 0):]
+            symbol_offset += segment.symbol_count
+
+        # the contexts cut by the end of the file are complete
+        for (match_offset, found, _) in pending:
+            yield (match_offset, found)
+
+    def __search_stored_text__(self, pattern: str, context: int):
+        """
+        Searches a literal pattern in the raw text of a stored file
+
+        :return: generator of (symbol offset of the match, text around the match)
+        :rtype: generator
+        """
+        offset = self.decoded_text.find(pattern)
+        while offset != -1:
+            yield (offset, self.decoded_text[max(offset - context, 0):offset + len(pattern) + context])
+            offset = self.decoded_text.find(pattern, offset + 1)
+
+    def __decode_symbols__(self, payload: bytes, checkpoint: tuple, first: int, stop: int, bit_count: int,
+                           transitions):
+        """
+        Decodes the symbols from first (included) to stop (excluded), a whole byte at a time
+
+        :param payload: huffman encoded bytes, without the padding information
+        :type payload: bytes
+        :param checkpoint: byte index, partial codeword at the start of this byte and number of codewords before it
+        :type checkpoint: tuple
+        :param first: offset of the first symbol to decode, not before the checkpoint
+        :type first: int
+        :param stop: offset of the symbol after the last one to decode
+        :type stop: int
+        :param bit_count: number of encoded bits, without the padding bits
+        :type bit_count: int
+        :param transitions: decoding of one byte from each partial codeword
+        :type transitions: _ByteTransitions
+        :return: decoded text
+        :rtype: str
+        """
+        (index, state, symbol_offset) = checkpoint
+        decoded = list()
+        while symbol_offset < stop and 8 * index < bit_count:
+            if 8 * (index + 1) > bit_count:
+                # the padding bits of the last byte would be decoded as symbols
+                symbols = transitions.decode_bits(
+                    state, payload[index], bit_count - 8 * index)
+            else:
+                (state, _, _, symbols) = transitions[state << 8 | payload[index]]
+            decoded.append(symbols[max(first - symbol_offset, 0):stop - symbol_offset])
+            symbol_offset += len(symbols)
+            index += 1
+        return ''.join(decoded)
 
     def write_encoded_text_to_file(self, file: str):
         """
@@ -477,33 +1187,465 @@ class Huffman:
             raise ValueError(
                 "No huffman encoded text was given.\nHint: Use method Huffman.build_encoded_text()")
 
-        self.add_padding()
-        with open(file, 'w') as output_file:
-            # write the encoding table
-            output_file.write(self.header)
+        with open(file, 'wb') as output_file:
+            output_file.write(self.build_compressed_data())
+
+    def build_compressed_data(self):
+        """
+        Builds the content of the compressed file: header, huffman encoded text in bytes and padding information.
+        The size is known in advance (see Huffman.compute_compressed_size()), so the content is built in a single
+        preallocated buffer, which is then written at once.
+
+        :return: content of the compressed file
+        :rtype: bytearray
+        :raises ValueError: if the encoded text does not match the frequency table and the code lengths
+        """
+        size = self.compute_compressed_size()
+        header_size = len(self.header)
+        payload_size = size - header_size - 1
+
+        # the padding bits fill the last byte of the encoded text
+        self.padding_count = 8 * payload_size - len(self.encoded_text)
+        if not 0 <= self.padding_count < 8:
+            raise ValueError(
+                "The encoded text does not match the frequency table.\nHint: Use the method Huffman.build_encoded_text()")
+
+        data = bytearray(size)
+        data[:header_size] = self.header
+
+        # convert the whole encoded text in bytes at once, the padding bits are the zeros shifted in on the right
+        self.byte_array = (int(self.encoded_text, 2) << self.padding_count).to_bytes(
+            payload_size, 'big')
+        data[header_size:-1] = self.byte_array
+        data[-1] = ord(str(self.padding_count))
+        return data
 
-        with open(file, 'ab') as output_file:
-            # convert encoded text in bytes to write to the file
-            self.get_byte_list()
-            output_file.write(bytes(self.byte_array))
-            output_file.write(str(self.padding_count).encode('utf-8'))
+    def write_stored_text_to_file(self, file: str):
+        """
+        Writes the text raw, for when the huffman encoding does not pay off (see Huffman.is_compressible()).
+        The header of a stored file has no symbols.
+
+        :raises EmptyFile: if there is no text to write
+        """
+        with open(file, 'wb') as output_file:
+            output_file.write(self.build_stored_data())
 
-    def add_padding(self):
+    def build_stored_data(self):
         """
-        Adds padding to the encoded text. Every char MUST HAVE 8 bits, so the encoded text must be divisible by 8 and padding
-        can be necessary.
+        Builds the content of a stored file: a header without symbols and the raw text
 
+        :return: content of the stored file
+        :rtype: bytes
+        :raises EmptyFile: if there is no text to store
         """
-        self.padding_count = self.count_padding_bits()
-        self.encoded_text += '0' * self.padding_count
+        if not self.decoded_text:
+            raise EmptyFile("Cannot store empty text")
 
-    def count_padding_bits(self):
-        return (8 - (len(self.encoded_text) % 8)) % 8
+        self.stored = True
+        self.header = encode_varint(0)
+        return self.header + self.decoded_text.encode('utf-8')
 
     def print_encoding(self):
+        # tabulate is only needed for the verbose output, so it is not loaded on every call
+        from tabulate import tabulate
+
+        # the occurences are unknown when only the header of a compressed file was read
+        symbol_heap = dict(self.symbol_heap)
         table = list()
-        for (char, freq) in self.symbol_heap:
-            table.append(['%r' % (char), freq, self.encoding_dict[char]])
+        for (char, code) in sorted(self.encoding_dict.items(), key=lambda l: (len(l[1]), l[1])):
+            table.append(['%r' % (char), symbol_heap.get(char, ''), code])
 
         headers = ['CHAR', 'OCCURENCES', 'ENCODING']
         print(tabulate(table, headers, tablefmt='fancy_outline'))
+
+
+def open_compressed_file(file: str):
+    """
+    Reads the header of a compressed file and rebuilds its decoding table, leaving the encoded text undecoded
+
+    :param file: compressed file
+    :type file: str
+    :return: object ready for Huffman.iter_decode() and Huffman.iter_lines()
+    :rtype: Huffman
+    """
+    with open(file, 'rb') as input_file:
+        return open_compressed_data(input_file.read())
+
+
+def open_compressed_data(data: bytes):
+    """
+    Same as open_compressed_file(), but from the content of a compressed file already in memory
+
+    :param data: content of the compressed file
+    :type data: bytes
+    :return: object ready for Huffman.iter_decode() and Huffman.iter_lines()
+    :rtype: Huffman
+    """
+    huffman = Huffman()
+    huffman.parse_compressed_data(data)
+    if huffman.stored or huffman.segments:
+        return huffman
+
+    huffman.build_canonical_encoding_dict()
+    huffman.build_decoding_dict_from_encoding_dict()
+    return huffman
+
+
+def compress_text(text: str):
+    """
+    Compresses a text in memory, storing it raw when the huffman encoding does not pay off
+
+    :param text: text to be compressed
+    :type text: str
+    :return: content of the compressed file
+    :rtype: bytes
+    :raises EmptyFile: if the text is empty
+    """
+    huffman = Huffman()
+    huffman.decoded_text = text
+    if not text:
+        raise EmptyFile("Cannot compress empty text")
+
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    if not huffman.is_compressible():
+        return huffman.build_stored_data()
+
+    huffman.build_code_tables()
+    huffman.build_header()
+    huffman.build_encoded_text()
+    return huffman.build_compressed_data()
+
+
+def decompress_data(data: bytes):
+    """
+    Decompresses the content of a compressed file in memory
+
+    :param data: content of the compressed file
+    :type data: bytes
+    :return: decoded text
+    :rtype: str
+    """
+    huffman = Huffman()
+    huffman.parse_compressed_data(data)
+    if huffman.stored:
+        return huffman.decoded_text
+    if huffman.segments:
+        return decode_segments(huffman.segments)
+
+    huffman.build_decoded_text_from_byte_array()
+    return huffman.decoded_text
+
+
+def parse_segment_table(table: bytes):
+    """
+    Parses the segment table of an appended file
+    Segment table format (all numbers are varints):
+        <segment count><segment kind><compressed size><original size>...
+
+    :param table: segment table, without the trailer
+    :type table: bytes
+    :return: (kind, compressed size, original size in bytes) of every segment
+    :rtype: list
+    :raises NoHeader: if the table has invalid format
+    """
+    segments = list()
+    try:
+        (segment_count, position) = decode_varint(table, 0)
+        for _ in range(segment_count):
+            (kind, position) = decode_varint(table, position)
+            (size, position) = decode_varint(table, position)
+            (original_size, position) = decode_varint(table, position)
+            segments.append((kind, size, original_size))
+    except IndexError:
+        raise NoHeader("Given compressed file has no valid segment table")
+    if position != len(table):
+        raise NoHeader("Given compressed file has no valid segment table")
+    return segments
+
+
+def build_segment_table(segments: list):
+    """
+    Builds the segment table of an appended file, followed by its offset and the SEGMENT_MAGIC
+
+    :param segments: (kind, compressed size, original size in bytes) of every segment
+    :type segments: list
+    :return: segment table and trailer
+    :rtype: bytes
+    """
+    table = bytearray(encode_varint(len(segments)))
+    for (kind, size, original_size) in segments:
+        table += encode_varint(kind) + encode_varint(size) + \
+            encode_varint(original_size)
+    table_offset = sum(size for (_, size, _) in segments)
+    return bytes(table) + table_offset.to_bytes(SEGMENT_OFFSET_SIZE, 'big') + SEGMENT_MAGIC
+
+
+def read_segment_table(compressed_file):
+    """
+    Reads the segment table at the end of an open compressed file, without reading the segments
+
+    The magic alone does not tell an appended file: a stored text may end with SEGMENT_MAGIC too. So the trailer is
+    only taken as such if its offset points to a segment table that describes exactly the data before it.
+
+    :param compressed_file: compressed file opened in binary mode
+    :type compressed_file: io.BufferedIOBase
+    :return: (kind, compressed size, original size in bytes) of every segment, None if nothing was appended to the file
+    :rtype: list
+    """
+    trailer_size = SEGMENT_OFFSET_SIZE + len(SEGMENT_MAGIC)
+    file_size = compressed_file.seek(0, os.SEEK_END)
+    if file_size < trailer_size:
+        return None
+
+    compressed_file.seek(file_size - trailer_size)
+    trailer = compressed_file.read()
+    if not trailer.endswith(SEGMENT_MAGIC):
+        return None
+
+    table_offset = int.from_bytes(trailer[:SEGMENT_OFFSET_SIZE], 'big')
+    if table_offset > file_size - trailer_size:
+        return None
+    compressed_file.seek(table_offset)
+    try:
+        segments = parse_segment_table(
+            compressed_file.read(file_size - trailer_size - table_offset))
+    except NoHeader:
+        return None
+
+    # an appended file has at least the first compressed file and one appended segment
+    if len(segments) < 2 or segments[0][0] != SEGMENT_NEW_TABLE:
+        return None
+    if any(kind not in (SEGMENT_NEW_TABLE, SEGMENT_REUSE_TABLE) for (kind, _, _) in segments):
+        return None
+    if sum(size for (_, size, _) in segments) != table_offset:
+        return None
+    return segments
+
+
+def open_segments(data: bytes, segments: list):
+    """
+    Reads the headers of the segments of an appended file and rebuilds their decoding tables, leaving the encoded
+    texts undecoded. A segment that reuses the code table shares the tables of the last segment that has one
+    (stored segments have none).
+
+    :param data: content of the appended file
+    :type data: bytes
+    :param segments: (kind, compressed size, original size in bytes) of every segment, see read_segment_table()
+    :type segments: list
+    :return: one object per segment, ready for Huffman.iter_decode() and Huffman.search()
+    :rtype: list
+    :raises NoHeader: if a segment reuses a code table, but no previous segment has one
+    """
+    opened = list()
+    table = None
+    position = 0
+    for (kind, size, _) in segments:
+        segment = data[position:position + size]
+        position += size
+
+        huffman = Huffman()
+        if kind == SEGMENT_NEW_TABLE:
+            huffman.parse_segment_data(segment)
+            if not huffman.stored:
+                huffman.build_canonical_encoding_dict()
+                huffman.build_decoding_dict_from_encoding_dict()
+                table = huffman
+        else:
+            if table == None:
+                raise NoHeader(
+                    "Appended segment has no code table to reuse")
+            huffman.code_lengths = table.code_lengths
+            huffman.encoding_dict = table.encoding_dict
+            huffman.decoding_dict = table.decoding_dict
+            huffman.parse_encoded_bytes(segment)
+        opened.append(huffman)
+
+    return opened
+
+
+def decode_segments(segments: list):
+    """
+    Decodes all the segments of an appended file
+
+    :param segments: segments opened with open_segments()
+    :type segments: list
+    :return: decoded text
+    :rtype: str
+    """
+    decoded = list()
+    for segment in segments:
+        if not segment.stored:
+            segment.build_decoded_text_from_byte_array()
+        decoded.append(segment.decoded_text)
+    return ''.join(decoded)
+
+
+def read_last_code_lengths(compressed_file, segments: list):
+    """
+    Reads the code lengths of the last segment that has a code table (stored segments have none), reading only
+    the headers
+
+    :param compressed_file: compressed file opened in binary mode
+    :type compressed_file: io.BufferedIOBase
+    :param segments: (kind, compressed size, original size in bytes) of every segment
+    :type segments: list
+    :return: code lengths, empty if no segment has a code table
+    :rtype: dict
+    """
+    position = sum(size for (_, size, _) in segments)
+    for (kind, size, _) in reversed(segments):
+        position -= size
+        if kind != SEGMENT_NEW_TABLE:
+            continue
+
+        # the symbol count takes at most 3 varint bytes (there are less than 2^21 code points), and each symbol at
+        # most 5: 3 for the code point delta and 2 for the code length
+        compressed_file.seek(position)
+        (symbol_count, _) = decode_varint(compressed_file.read(3), 0)
+        if symbol_count:
+            compressed_file.seek(position)
+            huffman = Huffman()
+            huffman.build_code_lengths_from_header(
+                compressed_file.read(3 + 5 * symbol_count))
+            return huffman.code_lengths
+
+    return dict()
+
+
+def encode_segment(text: str, code_lengths: dict):
+    """
+    Encodes appended text, reusing the given code table when all the symbols are in it and it is not worse than a
+    new table (see Huffman.estimate_encoded_size()). Otherwise the text is compressed with a table of its own.
+
+    :param text: appended text
+    :type text: str
+    :param code_lengths: code lengths of the last code table of the file
+    :type code_lengths: dict
+    :return: segment kind and content
+    :rtype: tuple
+    """
+    huffman = Huffman()
+    huffman.decoded_text = text
+    huffman.build_symbol_heap()
+
+    if code_lengths and all(symbol in code_lengths for symbol in huffman.symbol_heap):
+        # without header, the reused code table is already in the file
+        huffman.code_lengths = code_lengths
+        reused_size = huffman.compute_compressed_size()
+        huffman.sort_symbol_heap()
+        if huffman.is_compressible():
+            new_table_size = huffman.estimate_encoded_size()
+        else:
+            new_table_size = huffman.compute_stored_size()
+
+        if reused_size <= new_table_size:
+            huffman.build_canonical_encoding_dict()
+            huffman.build_encoded_text()
+            # without header: only the encoded text in bytes and the padding information
+            return (SEGMENT_REUSE_TABLE, huffman.build_compressed_data())
+
+    return (SEGMENT_NEW_TABLE, compress_text(text))
+
+
+def append_to_compressed_file(file: str, input_file: str, dry_run: bool = False):
+    """
+    Compresses what was appended to the input file since it was compressed (or last appended), and appends it to
+    the compressed file as a new segment. Only the new tail of the input file is read and encoded, and only the
+    segment table is rewritten, so each update costs as much as the appended data.
+
+    A compressed file without segments becomes the first segment. As it does not store the size of the original
+    text, it is decoded once to get it.
+
+    :param file: compressed file
+    :type file: str
+    :param input_file: uncompressed file that grew
+    :type input_file: str
+    :param dry_run: only encode the appended text, without writing anything to the compressed file
+    :type dry_run: bool
+    :return: (kind, compressed size, original size in bytes) of the new segment, None if nothing was appended
+    :rtype: tuple
+    :raises NotAppendable: if the input file is shorter than what was already compressed
+    :raises NotCompressable: if the appended text is not utf-8 text
+    :raises NoHeader: if the compressed file is empty or cannot be decoded
+    :raises InvalidPadding:
+    """
+    with open(file, 'rb' if dry_run else 'r+b') as compressed_file:
+        segments = read_segment_table(compressed_file)
+        if segments == None:
+            compressed_file.seek(0)
+            data = compressed_file.read()
+            # a corrupt payload fails anywhere in the decoding (codes, padding or utf-8 of a stored text)
+            try:
+                text = decompress_data(data)
+            except (EmptyFile, KeyError, IndexError, ValueError):
+                raise NoHeader("Given compressed file cannot be decoded")
+            segments = [(SEGMENT_NEW_TABLE, len(data), len(text.encode('utf-8')))]
+
+        with open(input_file, 'rb') as uncompressed_file:
+            original_end = sum(original_size for (_, _, original_size) in segments)
+            if uncompressed_file.seek(0, os.SEEK_END) < original_end:
+                raise NotAppendable(
+                    "The input file is shorter than the text already compressed")
+            uncompressed_file.seek(original_end)
+            tail = uncompressed_file.read()
+
+        # a symbol still being written at the end of the input file is left for the next update
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        try:
+            text = decoder.decode(tail)
+        except UnicodeDecodeError:
+            raise NotCompressable("Only utf-8 encoded files are compressable")
+        if not text:
+            return None
+
+        (kind, data) = encode_segment(
+            text, read_last_code_lengths(compressed_file, segments))
+        segments.append(
+            (kind, len(data), len(tail) - len(decoder.getstate()[0])))
+        if dry_run:
+            return segments[-1]
+
+        compressed_file.seek(sum(size for (_, size, _) in segments[:-1]))
+        compressed_file.write(data + build_segment_table(segments))
+        compressed_file.truncate()
+
+    return segments[-1]
+
+
+def iter_decode(file: str, chunk_size: int = DECODE_CHUNK_SIZE):
+    """
+    Lazily decodes a compressed file, yielding chunks of at most chunk_size symbols
+
+    :param file: compressed file
+    :type file: str
+    :param chunk_size: maximum number of symbols yielded at once
+    :type chunk_size: int
+    """
+    yield from open_compressed_file(file).iter_decode(chunk_size)
+
+
+def iter_lines(file: str):
+    """
+    Lazily decodes a compressed file, yielding one line at a time
+
+    :param file: compressed file
+    :type file: str
+    """
+    yield from open_compressed_file(file).iter_lines()
+
+
+def search(file: str, pattern: str, context: int = SEARCH_CONTEXT_SIZE):
+    """
+    Searches a literal pattern in a compressed file without decompressing it
+
+    :param file: compressed file
+    :type file: str
+    :param pattern: literal text to search for
+    :type pattern: str
+    :param context: number of symbols decoded before and after each match
+    :type context: int
+    :return: generator of (symbol offset of the match, decoded context around the match)
+    :rtype: generator
+    """
+    yield from open_compressed_file(file).search(pattern, context)
@@ -0,0 +1,235 @@
+import builtins
+import codecs
+import io
+from .huffman import open_compressed_data, compress_text, encode_varint, NotCompressable, DECODE_CHUNK_SIZE
+
+"""
+File-like interface to compressed files, modelled on gzip.open() and lzma.open(), so that code working with
+binary or text streams can read and write compressed files directly, without temporary files.
+
+The huffman codec works on text: reading gives the utf-8 bytes of the decoded text, and what is written must be
+utf-8 text. Reading is lazy, the text is decoded as it is read. Writing is not: the header needs the frequency
+table of the whole text, so the written data is kept in memory and compressed when the file is closed.
+"""
+
+_MODE_READ = 1
+_MODE_WRITE = 2
+
+
+class _DecodeReader(io.RawIOBase):
+    """
+    Raw stream of the utf-8 bytes of the decoded text, decoded lazily with Huffman.iter_decode()
+    """
+
+    def __init__(self, data: bytes):
+        self._data = data
+        self._rewind()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def _rewind(self):
+        self._chunks = open_compressed_data(
+            self._data).iter_decode(DECODE_CHUNK_SIZE)
+        self._pending = bytes()
+        self._pending_offset = 0
+        self._position = 0
+
+    def readinto(self, b):
+        with memoryview(b) as view, view.cast('B') as byte_view:
+            while self._pending_offset == len(self._pending):
+                chunk = next(self._chunks, None)
+                if chunk == None:
+                    return 0
+                self._pending = chunk.encode('utf-8')
+                self._pending_offset = 0
+
+            size = min(len(byte_view), len(self._pending) -
+                       self._pending_offset)
+            byte_view[:size] = self._pending[self._pending_offset:self._pending_offset + size]
+            self._pending_offset += size
+            self._position += size
+            return size
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        """
+        Seeks by decoding: forward seeks skip the decoded bytes, backward seeks decode again from the beginning
+        """
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            raise ValueError("Seek from end not supported")
+        elif whence != io.SEEK_SET:
+            raise ValueError("Invalid whence (%r)" % (whence))
+
+        if offset < self._position:
+            self._rewind()
+
+        skip = bytearray(DECODE_CHUNK_SIZE)
+        while self._position < offset:
+            if not self.readinto(memoryview(skip)[:offset - self._position]):
+                break
+        return self._position
+
+
+class HuffmanFile(io.BufferedIOBase):
+    """
+    Compressed file opened in binary mode, over a file name or any binary file object
+
+    :param filename: file to be opened, if no fileobj is given
+    :type filename: str
+    :param mode: 'r'/'rb' to read, 'w'/'wb' to write, 'x'/'xb' to create
+    :type mode: str
+    :param fileobj: binary file object to read from or to write to
+    :type fileobj: io.BufferedIOBase
+    """
+
+    def __init__(self, filename: str = None, mode: str = 'rb', fileobj=None):
+        self._fileobj = None
+        self._buffer = None
+        if mode in ('r', 'rb'):
+            self._mode = _MODE_READ
+        elif mode in ('w', 'wb', 'x', 'xb'):
+            self._mode = _MODE_WRITE
+        else:
+            raise ValueError("Invalid mode: %r" % (mode))
+
+        if fileobj == None:
+            if filename == None:
+                raise TypeError("Either a file name or a file object is needed")
+            fileobj = builtins.open(filename, mode.replace('b', '') + 'b')
+            self._close_fileobj = True
+        else:
+            self._close_fileobj = False
+        self._fileobj = fileobj
+
+        if self._mode == _MODE_READ:
+            self._buffer = io.BufferedReader(_DecodeReader(fileobj.read()))
+        else:
+            self._buffer = io.BytesIO()
+
+    @property
+    def closed(self):
+        return self._fileobj == None
+
+    def close(self):
+        """
+        Closes the file. In write mode, the written text is compressed and written to the file object
+        """
+        if self.closed:
+            return
+        try:
+            if self._mode == _MODE_WRITE:
+                try:
+                    text = self._buffer.getvalue().decode('utf-8')
+                except UnicodeDecodeError:
+                    raise NotCompressable(
+                        "Only utf-8 encoded text is compressable")
+                # an empty text is stored as a header without symbols
+                self._fileobj.write(compress_text(text)
+                                    if text else encode_varint(0))
+        finally:
+            try:
+                if self._close_fileobj:
+                    self._fileobj.close()
+            finally:
+                self._fileobj = None
+                self._buffer = None
+
+    def fileno(self):
+        self._check_not_closed()
+        return self._fileobj.fileno()
+
+    def readable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_READ
+
+    def writable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_WRITE
+
+    def seekable(self):
+        self._check_not_closed()
+        return self._mode == _MODE_READ
+
+    def read(self, size: int = -1):
+        self._check_mode(_MODE_READ)
+        return self._buffer.read(size)
+
+    def read1(self, size: int = -1):
+        self._check_mode(_MODE_READ)
+        return self._buffer.read1(size)
+
+    def readinto(self, b):
+        self._check_mode(_MODE_READ)
+        return self._buffer.readinto(b)
+
+    def readline(self, size: int = -1):
+        self._check_mode(_MODE_READ)
+        return self._buffer.readline(size)
+
+    def peek(self, size: int = 0):
+        self._check_mode(_MODE_READ)
+        return self._buffer.peek(size)
+
+    def write(self, data):
+        self._check_mode(_MODE_WRITE)
+        return self._buffer.write(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET):
+        self._check_mode(_MODE_READ)
+        return self._buffer.seek(offset, whence)
+
+    def tell(self):
+        self._check_not_closed()
+        return self._buffer.tell()
+
+    def _check_not_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _check_mode(self, mode: int):
+        self._check_not_closed()
+        if self._mode != mode:
+            raise io.UnsupportedOperation(
+                "File not open for %s" % ("reading" if mode == _MODE_READ else "writing"))
+
+
+def open(filename, mode: str = 'rb', encoding: str = None, errors: str = None, newline: str = None):
+    """
+    Opens a compressed file in binary or text mode, like gzip.open() and lzma.open()
+
+    :param filename: file name or binary file object
+    :type filename: str or io.BufferedIOBase
+    :param mode: 'r', 'w' or 'x', with 'b' for binary mode (default) or 't' for text mode
+    :type mode: str
+    :param encoding: text mode only, must be utf-8 (the default)
+    :type encoding: str
+    :return: HuffmanFile in binary mode, io.TextIOWrapper over it in text mode
+    :rtype: HuffmanFile or io.TextIOWrapper
+    :raises ValueError: if the mode is invalid, or if the encoding is not utf-8
+    """
+    if 't' in mode:
+        if 'b' in mode:
+            raise ValueError("Invalid mode: %r" % (mode))
+        # the codec always works on utf-8 text
+        if encoding != None and codecs.lookup(encoding).name != 'utf-8':
+            raise ValueError("Only utf-8 encoding is supported: %r" % (encoding))
+    elif encoding != None or errors != None or newline != None:
+        raise ValueError("Argument not supported in binary mode")
+
+    file_mode = mode.replace('t', '')
+    if isinstance(filename, (str, bytes)) or hasattr(filename, '__fspath__'):
+        binary_file = HuffmanFile(filename, file_mode)
+    else:
+        binary_file = HuffmanFile(None, file_mode, fileobj=filename)
+
+    if 't' in mode:
+        return io.TextIOWrapper(binary_file, 'utf-8', errors, newline)
+    return binary_file
@@ -31,14 +31,29 @@ import argparse
 import sys
 import os
 import csv
-from modules.huffman import Huffman, NotCompressable, EmptyFile, NoHeader, InvalidPadding
+from modules.huffman import Huffman, NotCompressable, EmptyFile, NoHeader, InvalidPadding, NotAppendable, SEARCH_CONTEXT_SIZE, \
+    SEGMENT_REUSE_TABLE, append_to_compressed_file
+from modules.archive import add_to_archive, extract_archive, read_table_of_contents, InvalidArchive, MemberNotFound
 
 
-def main():
+def main(argv: list = None):
     # user's input possibilities need to be defined
     argparser: argparse.ArgumentParser = define_program_args()
 
-    args: argparse.Namespace = argparser.parse_args()
+    args: argparse.Namespace = argparser.parse_args(argv)
+
+    # the daemon keeps this process alive, the requests come from client.py
+    if args.serve != None:
+        # the daemon modules (sockets, json, signals) are only loaded when serving, not on every call
+        from modules.daemon import serve, DAEMON_SOCKET
+        socket_path = args.serve or DAEMON_SOCKET
+        print("Serving on " + socket_path)
+        serve(socket_path, main)
+        return
+
+    if args.archive:
+        run_archive_mode(argparser, args)
+        return
 
     # the user needs to provide or an input message or input file, and define if the input will be compressed or decompressed
     if args_incomplete(args):
@@ -51,12 +66,32 @@ def main():
         sys.exit(argparser.prog +
                  ": error: arguments -d/--decompress: not allowed woth argument -m/--message")
 
+    if args.dry_run and not args.compress:
+        argparser.print_usage()
+        sys.exit(argparser.prog +
+                 ": error: argument --dry-run: only allowed with argument -c/--compress")
+
+    # the search is done on the huffman encoded bytes, so it only makes sense on compressed files
+    if args.grep and not args.decompress:
+        argparser.print_usage()
+        sys.exit(argparser.prog +
+                 ": error: argument -g/--grep: only allowed with argument -d/--decompress")
+
+    # appending only makes sense if the file was already compressed, otherwise it is compressed as usual
+    if args.append and args.compress and args.file and args.output and os.path.exists(args.output):
+        run_append_mode(argparser, args)
+        return
+
     huffman = Huffman()
     try:
         if args.file:
             if args.compress:
                 huffman.parse_uncompressed_file(args.file)
 
+            elif args.grep:
+                # the encoded text is kept in bytes, only the surrounding context of the matches is decoded
+                huffman.parse_compressed_header(args.file)
+
             else:
                 huffman.parse_compressed_file(args.file)
 
@@ -69,7 +104,7 @@ def main():
         sys.exit(argparser.prog + ": cannot compress empty file/string")
     except NotCompressable:
         sys.exit(argparser.prog +
-                 ": only extended-ascii/utf8 encoded files are compressable")
+                 ": only utf-8 encoded files are compressable")
     except NoHeader:
         sys.exit(argparser.prog + ": given compressed file has no table header")
     except ValueError:
@@ -79,27 +114,54 @@ def main():
         sys.exit(argparser.prog +
                  ": the acquired padding (%d bits) is not possible" % (huffman.padding_count))
 
-    huffman.build_symbol_heap()
+    # stored files hold the raw text, there is nothing to decode. Appended files are decoded (or searched) segment
+    # by segment, each with its own code table
+    if huffman.stored or huffman.segments:
+        if args.grep:
+            print_search_results(huffman, args.grep, args.context)
+        else:
+            with open(args.output, 'w', encoding='utf-8', newline='') as output_file:
+                output_file.write(huffman.decoded_text)
+        return
 
-    # sort the frequency table to ease the transformation of the list in the huffman's tree
-    huffman.sort_symbol_heap()
+    if args.compress:
+        huffman.build_symbol_heap()
 
-    # create the huffman tree from the symbol frequency table
-    huffman.build_tree()
+        # sort the frequency table to ease the transformation of the list in the huffman's tree
+        huffman.sort_symbol_heap()
 
-    # interpret the tree and assign '0' to the left child node and '1' to the right child node of each node
-    huffman.build_encoding_dict()
+        # the exact size is computed from the frequency table and the code lengths, nothing is encoded nor written
+        if args.dry_run:
+            print_dry_run(huffman)
+            return
 
-    if args.verbose:
-        print("Algorithm's generated table:")
-        huffman.print_encoding()
+        # when the huffman encoding would not pay off, the text is stored raw and the tree is not even built
+        if not huffman.is_compressible():
+            huffman.write_stored_text_to_file(args.output)
+
+            if args.verbose:
+                print("The huffman encoding does not pay off, the text was stored uncompressed")
+                if args.file:
+                    print_statistics_with_input_file(
+                        huffman, args.file, args.output)
+
+            if args.save_encoded_binary or args.save_encoding_table:
+                print("The text was stored uncompressed, there is no encoding to save")
+            return
+
+        # create the huffman tree from the symbol frequency table, then
+        # interpret the tree and assign '0' to the left child node and '1' to the right child node of each node
+        huffman.build_code_tables()
+
+        if args.verbose:
+            print("Algorithm's generated table:")
+            huffman.print_encoding()
 
-    if args.compress:
         huffman.build_header()
 
         if args.verbose:
             print("Header added to the encoded file:")
-            print(huffman.header)
+            print(huffman.header.hex(' '))
             print()
 
         huffman.build_encoded_text()
@@ -115,9 +177,28 @@ def main():
                                                       args.message, args.output)
 
     else:
+        # the header holds the code lengths, from which the canonical codes are rebuilt without any tree
+        huffman.build_canonical_encoding_dict()
         huffman.build_decoding_dict_from_encoding_dict()
+        if args.grep:
+            if args.verbose:
+                print("Table read from the header:")
+                huffman.print_encoding()
+            print_search_results(huffman, args.grep, args.context)
+            return
+
         huffman.build_decoded_text()
-        with open(args.output, 'w') as output_file:
+
+        # the occurences are not stored in the header, so they are counted in the decoded text
+        if args.verbose or args.save_encoding_table:
+            huffman.build_symbol_heap()
+            huffman.sort_symbol_heap()
+
+        if args.verbose:
+            print("Algorithm's generated table:")
+            huffman.print_encoding()
+
+        with open(args.output, 'w', encoding='utf-8', newline='') as output_file:
             output_file.write(huffman.decoded_text)
 
     if args.save_encoded_binary:
@@ -132,6 +213,103 @@ def main():
                             huffman.symbol_heap, args.save_encoding_table)
 
 
+def run_archive_mode(argparser: argparse.ArgumentParser, args: argparse.Namespace):
+    """ 
+    Adds files to (-c), extracts members from (-d) or lists the members of (-l) a multi-file archive
+
+    :param argparser: to print the usage on errors
+    :type argparser: argparse.ArgumentParser
+    :param args: program arguments
+    :type args: argparse.Namespace
+    """
+    if args.list:
+        (members, _) = read_archive_members(argparser, args.archive)
+        print_archive_members(members)
+        return
+
+    if args.compress and not args.members:
+        argparser.print_usage()
+        sys.exit(argparser.prog +
+                 ": error: argument -a/--archive: -c/--compress needs the files in --members")
+    if args.decompress and not args.output:
+        argparser.print_usage()
+        sys.exit(argparser.prog +
+                 ": error: argument -a/--archive: -d/--decompress needs the output directory in -o/--output")
+    if not args.compress and not args.decompress:
+        argparser.print_usage()
+        sys.exit(argparser.prog + ": too few comamnd-line arguments")
+
+    try:
+        if args.compress:
+            members = add_to_archive(args.archive, args.members, args.jobs)
+            if args.verbose:
+                print_archive_members(members)
+        else:
+            for path in extract_archive(args.archive, args.output, args.members, args.jobs):
+                if args.verbose:
+                    print(path)
+
+    except FileNotFoundError as error:
+        sys.exit(argparser.prog + ": file does not exist: %s" % (error.filename))
+    except NotCompressable:
+        sys.exit(argparser.prog +
+                 ": only utf-8 encoded files are compressable")
+    except (InvalidArchive, MemberNotFound) as error:
+        sys.exit(argparser.prog + ": %s" % (error))
+
+
+def run_append_mode(argparser: argparse.ArgumentParser, args: argparse.Namespace):
+    """ 
+    Compresses only what was appended to the input file since the output file was written, and appends it to the
+    output file as a new segment. With --dry-run, only the size of the segment is printed, nothing is written
+
+    :param argparser: to print the error messages
+    :type argparser: argparse.ArgumentParser
+    :param args: program arguments
+    :type args: argparse.Namespace
+    """
+    try:
+        segment = append_to_compressed_file(
+            args.output, args.file, args.dry_run)
+    except FileNotFoundError:
+        sys.exit(argparser.prog + ": file does not exist")
+    except NotCompressable:
+        sys.exit(argparser.prog +
+                 ": only utf-8 encoded files are compressable")
+    except (NotAppendable, NoHeader, InvalidPadding) as error:
+        sys.exit(argparser.prog + ": %s" % (error))
+
+    if args.verbose or args.dry_run:
+        if segment == None:
+            print("Nothing was appended to the input file")
+        else:
+            (kind, size, original_size) = segment
+            print("%s %d bytes compressed into a %d bytes segment (%s)" %
+                  ("Would append" if args.dry_run else "Appended", original_size, size,
+                   "reusing the code table" if kind == SEGMENT_REUSE_TABLE else "new code table"))
+
+
+def read_archive_members(argparser: argparse.ArgumentParser, archive: str):
+    """ 
+    Reads the members of the archive, exiting with an error message if it is not a valid archive
+
+    :return: members of the archive and the offset of its table of contents
+    :rtype: tuple
+    """
+    try:
+        return read_table_of_contents(archive)
+    except FileNotFoundError:
+        sys.exit(argparser.prog + ": file does not exist")
+    except InvalidArchive as error:
+        sys.exit(argparser.prog + ": %s" % (error))
+
+
+def print_archive_members(members: list):
+    for member in members:
+        print("%s: %d bytes (%d bytes uncompressed)" %
+              (member.name, member.size, member.original_size))
+
+
 def save_encoding_table(encoding_dict: dict, symbol_heap: dict, file: str):
     if not encoding_dict:
         raise ValueError("Cannot save empty encoding dict")
@@ -153,6 +331,45 @@ def save_binary(encoded_text: str, file: str):
         out_bin.write(encoded_text)
 
 
+def print_dry_run(huffman: Huffman):
+    """ 
+    Prints the exact size the compressed file would have, without encoding the text
+
+    :param huffman: Huffman class object with the sorted frequency table of the text
+    :type huffman: Huffman
+    """
+    original_size = len(huffman.decoded_text.encode('utf-8'))
+    if huffman.is_compressible():
+        huffman.build_code_tables()
+        huffman.build_header()
+        compressed_size = huffman.compute_compressed_size()
+        print("Uncompressed size: %d bytes" % (original_size))
+        print("Compressed size: %d bytes" % (compressed_size))
+        print("+-- Header size: %d bytes" % (len(huffman.header)))
+    else:
+        compressed_size = huffman.compute_stored_size()
+        print("Uncompressed size: %d bytes" % (original_size))
+        print("Compressed size: %d bytes (stored uncompressed)" %
+              (compressed_size))
+    print("The compressed file would be %.2f%% the size of the original file" %
+          (100*compressed_size/original_size))
+
+
+def print_search_results(huffman: Huffman, pattern: str, context: int):
+    """ 
+    Prints every match of the pattern in the compressed text with its symbol offset and surrounding context
+
+    :param huffman: Huffman class object with the compressed file header already parsed
+    :type huffman: Huffman
+    :param pattern: literal text to search for
+    :type pattern: str
+    :param context: number of symbols shown before and after each match
+    :type context: int
+    """
+    for (offset, text) in huffman.search(pattern, context):
+        print("%d: %r" % (offset, text))
+
+
 def print_statistics_with_input_file(huffman: Huffman, input_file: str, output_file: str):
     """ 
     Prints compression statistics on the terminal
@@ -199,7 +416,8 @@ def args_incomplete(args: argparse.Namespace):
     :return: value indicating if the args arre complete or incomplete
     :rtype: bool
     """
-    return (not args.file and not args.message) or (not args.compress and not args.decompress)
+    return (not args.file and not args.message) or (not args.compress and not args.decompress) \
+        or (not args.output and not args.grep and not args.dry_run)
 
 
 def args_mutex(args: argparse.Namespace):
@@ -217,6 +435,44 @@ def args_mutex(args: argparse.Namespace):
     return args.decompress and args.message
 
 
+def non_negative_int(value: str):
+    """
+    Converts a command-line option to an integer that is zero or greater
+
+    :param value: the option as typed by the user
+    :type value: str
+    :return: the option as an integer
+    :rtype: int
+    :raises ArgumentTypeError: if the option is not an integer or is negative
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: '%s'" % (value))
+    if number < 0:
+        raise argparse.ArgumentTypeError("must be 0 or greater, not %d" % (number))
+    return number
+
+
+def positive_int(value: str):
+    """
+    Converts a command-line option to an integer that is 1 or greater
+
+    :param value: the option as typed by the user
+    :type value: str
+    :return: the option as an integer
+    :rtype: int
+    :raises ArgumentTypeError: if the option is not an integer or is lower than 1
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid int value: '%s'" % (value))
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be 1 or greater, not %d" % (number))
+    return number
+
+
 def define_program_args():
     """ 
     Sets the possible command-line arguments and options.
@@ -244,7 +500,7 @@ def define_program_args():
         to see how it would be compressed.", type=str)
 
     argparser.add_argument(
-        "-o", "--output", help="compressor's output file", type=str, required=True)
+        "-o", "--output", help="compressor's output file (not needed with -g/--grep)", type=str)
 
     argparser.add_argument("-v", "--verbose", help="show encoding table and \
         processing texts", action='store_true')
@@ -255,6 +511,35 @@ def define_program_args():
     argparser.add_argument("-s", "--save-encoded-binary", help="save the text encoded \
         in binary before converting it to UTF-8 code", type=str)
 
+    argparser.add_argument("-g", "--grep", help="search a literal pattern in the compressed \
+        file without decompressing it", type=str)
+
+    argparser.add_argument("-C", "--context", help="number of symbols shown around each \
+        match of -g/--grep", type=non_negative_int, default=SEARCH_CONTEXT_SIZE)
+
+    argparser.add_argument("--dry-run", help="with -c, only print the exact size of the \
+        compressed file, without writing it", action='store_true')
+
+    argparser.add_argument("--append", help="with -c, if the output file exists, only compress \
+        what was appended to the input file since then", action='store_true')
+
+    argparser.add_argument("-a", "--archive", help="multi-file archive: -c adds the --members \
+        files to it, -d extracts all (or the --members) files to the -o directory", type=str)
+
+    argparser.add_argument("--members", help="files added to or extracted from \
+        the -a/--archive", type=str, nargs='+')
+
+    argparser.add_argument("-l", "--list", help="list the members of the \
+        -a/--archive", action='store_true')
+
+    argparser.add_argument("-j", "--jobs", help="number of processes compressing or \
+        extracting archive members at the same time", type=positive_int)
+
+    argparser.add_argument("--serve", help="run as a daemon serving the requests of \
+        client.py on a Unix socket (by default $HUFFMAN_SOCKET, or huffman.sock in $XDG_RUNTIME_DIR or in a private \
+        huffman-<uid> directory of the temporary directory)", \
+        type=str, nargs='?', const='')
+
     return argparser
 
 
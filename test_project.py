@@ -1,8 +1,14 @@
 #!/usr/bin/env python3.8
-from project import save_encoding_table, save_binary, define_program_args
-from modules.huffman import Huffman
+from project import save_encoding_table, save_binary, define_program_args, main
+from modules.huffman import Huffman, iter_decode, iter_lines, search, find_bit_pattern, encode_varint, decode_varint, \
+    append_to_compressed_file, decompress_data, compress_text, NoHeader, SEGMENT_NEW_TABLE, SEGMENT_REUSE_TABLE
+from modules.daemon import make_server, send_request, UntrustedSocket
+from modules import huffman_file
+from modules.archive import add_to_archive, extract_archive, read_table_of_contents, MemberNotFound, InvalidArchive
 import pytest
 import os
+import io
+import threading
 TEST_FILE = 'huffman_test_file'
 
 # PROJECT.PY TESTS
@@ -79,3 +85,330 @@ def test_huffman_sort_symbol_heap():
 
 
 # HUFFMAN MODULE TESTS
+
+
+def compress_text_to_file(text: str, file: str):
+    huffman = Huffman()
+    huffman.decoded_text = text
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    huffman.build_code_tables()
+    huffman.build_header()
+    huffman.build_encoded_text()
+    huffman.write_encoded_text_to_file(file)
+
+
+def test_huffman_iter_decode():
+    text = 'first line\nerror: second line\nthird line\n' * 10
+    compress_text_to_file(text, TEST_FILE)
+    chunks = list(iter_decode(TEST_FILE, chunk_size=7))
+    os.remove(TEST_FILE)
+    assert ''.join(chunks) == text
+    assert all(len(chunk) <= 7 for chunk in chunks)
+
+
+def test_huffman_iter_lines_early_termination():
+    text = 'first line\nerror: second line\nthird line'
+    compress_text_to_file(text, TEST_FILE)
+    lines = list(iter_lines(TEST_FILE))
+    first_error = next(line for line in iter_lines(TEST_FILE)
+                       if line.startswith('error'))
+    os.remove(TEST_FILE)
+    assert lines == ['first line\n', 'error: second line\n', 'third line']
+    assert first_error == 'error: second line\n'
+
+
+def test_huffman_search():
+    text = 'hello world\nfoo bar baz\nerror: something\nfoo again'
+    compress_text_to_file(text, TEST_FILE)
+    matches = list(search(TEST_FILE, 'foo', context=3))
+    missing = list(search(TEST_FILE, 'qux'))
+    with pytest.raises(ValueError):
+        list(search(TEST_FILE, 'foo', context=-2))
+    os.remove(TEST_FILE)
+    assert [offset for (offset, _) in matches] == [12, 41]
+    assert matches[0][1] == 'ld\nfoo ba'
+    assert missing == []
+    with pytest.raises(SystemExit):
+        define_program_args().parse_args(['-d', '-f', TEST_FILE, '-g', 'foo', '-C', '-50'])
+
+
+def test_huffman_search_codeword_boundaries():
+    text = 'abracadabra' * 20 + 'zebra'
+    compress_text_to_file(text, TEST_FILE)
+    for pattern in ['a', 'bra', 'cad', 'ze', 'aab', 'zebra']:
+        matches = list(search(TEST_FILE, pattern, 5))
+        expected = [(i, text[max(i - 5, 0):i + len(pattern) + 5])
+                    for i in range(len(text)) if text.startswith(pattern, i)]
+        assert matches == expected
+    os.remove(TEST_FILE)
+
+
+def test_find_bit_pattern():
+    data = bytes([0b10110011, 0b01011001, 0b10000000])
+    bits = '101100110101100110000000'
+    for pattern in ['1', '011', '10110011', '0110101100', '1100']:
+        expected = [i for i in range(20 - len(pattern) + 1) if bits.startswith(pattern, i)]
+        assert list(find_bit_pattern(data, int(pattern, 2), len(pattern), 20)) == expected
+
+
+def test_huffman_is_compressible():
+    huffman = Huffman()
+    huffman.decoded_text = 'a' * 500 + 'b' * 20 + 'c' * 5
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    assert huffman.is_compressible()
+
+    huffman = Huffman()
+    huffman.decoded_text = ''.join(chr(i) for i in range(32, 127))
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    assert not huffman.is_compressible()
+
+    # the entropy estimate is below the stored size, but the real huffman codes are not
+    text = ''.join(chr(65 + i) * 6 for i in range(38)) + 'a'
+    huffman = Huffman()
+    huffman.decoded_text = text
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    assert huffman.estimate_encoded_size() < huffman.compute_stored_size()
+    assert not huffman.is_compressible()
+    assert len(compress_text(text)) == huffman.compute_stored_size()
+
+
+def test_huffman_stored_file():
+    text = ''.join(chr(i) for i in range(32, 127)) + '\nlast line'
+    huffman = Huffman()
+    huffman.decoded_text = text
+    huffman.write_stored_text_to_file(TEST_FILE)
+    size = os.stat(TEST_FILE).st_size
+
+    huffman = Huffman()
+    huffman.parse_compressed_file(TEST_FILE)
+    lines = list(iter_lines(TEST_FILE))
+    matches = list(search(TEST_FILE, 'last', context=1))
+    os.remove(TEST_FILE)
+    assert size == len(text) + 1
+    assert huffman.stored
+    assert huffman.decoded_text == text
+    assert ''.join(lines) == text
+    assert matches == [(96, '\nlast ')]
+
+
+def test_daemon_request(tmp_path, monkeypatch):
+    socket_path = str(tmp_path / 'huffman.sock')
+    server = make_server(socket_path, main)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    # only the current user can connect to the daemon
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+    try:
+        compressed = send_request(
+            ['-c', '-m', 'hello hello world', '-o', str(tmp_path / 'out.huf')], socket_path)
+        matches = send_request(
+            ['-d', '-f', str(tmp_path / 'out.huf'), '-g', 'world', '-C', '0'], socket_path)
+        missing = send_request(
+            ['-d', '-f', str(tmp_path / 'missing.huf'), '-o', 'out.txt'], socket_path)
+        serving = send_request(['--ser', str(tmp_path / 'other.sock')], socket_path)
+        # a socket of another user could read the request and forge the answer
+        with monkeypatch.context() as patch:
+            patch.setattr(os, 'getuid', lambda: os.stat(socket_path).st_uid + 1)
+            with pytest.raises(UntrustedSocket):
+                send_request(['-h'], socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+    assert compressed == (0, '', '')
+    assert matches == (0, "12: 'world'\n", '')
+    assert missing == (1, '', 'project.py: file does not exist\n')
+    assert serving[0] == 1 and not os.path.exists(tmp_path / 'other.sock')
+
+
+def test_varint():
+    data = b''.join(encode_varint(value) for value in [0, 127, 128, 0x10FFFF])
+    values = list()
+    position = 0
+    while position < len(data):
+        (value, position) = decode_varint(data, position)
+        values.append(value)
+    assert encode_varint(300) == bytes([0xac, 0x02])
+    assert values == [0, 127, 128, 0x10FFFF]
+
+
+def test_huffman_canonical_encoding_dict():
+    huffman = Huffman()
+    huffman.code_lengths = {'e': 3, 'a': 2, 'd': 3, 'c': 2, 'b': 2}
+    huffman.build_canonical_encoding_dict()
+    assert huffman.encoding_dict == {'a': '00', 'b': '01', 'c': '10',
+                                     'd': '110', 'e': '111'}
+
+
+def test_huffman_unicode_header():
+    text = ('日本語のログ 😀🎉 ' + chr(7) + chr(127) + '\n') * 50 + '한국어'
+    compress_text_to_file(text, TEST_FILE)
+    huffman = Huffman()
+    huffman.parse_compressed_file(TEST_FILE)
+    huffman.build_canonical_encoding_dict()
+    huffman.build_decoding_dict_from_encoding_dict()
+    huffman.build_decoded_text()
+    os.remove(TEST_FILE)
+    assert set(huffman.code_lengths) == set(text)
+    assert huffman.decoded_text == text
+
+
+def test_archive(tmp_path, monkeypatch):
+    archive = str(tmp_path / 'test.hfa')
+    texts = {'a.txt': 'aaaaaaaabbbbbbbcccccc' * 10,
+             'b.txt': '日本語のログ\n' * 10, 'c.txt': 'xyz', 'e.txt': ''}
+    for (name, text) in texts.items():
+        (tmp_path / name).write_text(text, encoding='utf-8')
+
+    monkeypatch.chdir(tmp_path)
+    add_to_archive(archive, ['a.txt', 'b.txt'], workers=2)
+    (first_members, _) = read_table_of_contents(archive)
+    add_to_archive(archive, ['c.txt', 'e.txt'])
+    (members, _) = read_table_of_contents(archive)
+    extract_archive(archive, 'all', workers=2)
+    extract_archive(archive, 'some', ['c.txt'])
+    with pytest.raises(MemberNotFound):
+        extract_archive(archive, 'some', ['d.txt'])
+    for jobs in ['0', '-2']:
+        with pytest.raises(SystemExit):
+            define_program_args().parse_args(['-a', archive, '-l', '-j', jobs])
+
+    # the members already in the archive are not moved when new ones are added
+    assert members[:2] == first_members
+    assert [member.name for member in members] == ['a.txt', 'b.txt', 'c.txt', 'e.txt']
+    for (name, text) in texts.items():
+        assert (tmp_path / 'all' / name).read_text(encoding='utf-8') == text
+    assert os.listdir(tmp_path / 'some') == ['c.txt']
+
+    # a corrupt padding byte must not leak a ValueError
+    with open(archive, 'r+b') as archive_file:
+        archive_file.seek(members[0].offset + members[0].size - 1)
+        archive_file.write(b'x')
+    with pytest.raises(InvalidArchive):
+        extract_archive(archive, str(tmp_path / 'corrupt'), ['a.txt'])
+
+
+def test_append_to_compressed_file(tmp_path):
+    log = tmp_path / 'test.log'
+    compressed = str(tmp_path / 'test.huf')
+    text = 'INFO request served in 12 ms\nWARN slow request 340 ms\n' * 20
+    log.write_text(text)
+    compress_text_to_file(text, compressed)
+
+    segments = list()
+    for tail in ['INFO request served in 21 ms\n' * 5, '', 'ERROR ÿ disk full!\n']:
+        with open(log, 'a') as log_file:
+            log_file.write(tail)
+        segments.append(append_to_compressed_file(compressed, str(log)))
+        text += tail
+
+    with open(compressed, 'rb') as compressed_file:
+        decoded = decompress_data(compressed_file.read())
+    assert segments[0][0] == SEGMENT_REUSE_TABLE
+    assert segments[1] == None
+    # symbols that are not in the code table need a new one
+    assert segments[2][0] == SEGMENT_NEW_TABLE
+    assert decoded == text
+
+    # the segments are decoded and searched one after the other, the matches spanning two segments included
+    assert list(iter_lines(compressed)) == text.splitlines(True)
+    for pattern in ['340 ms\nINFO request served in 21', 'ms\n', 'ÿ']:
+        expected = [(i, text[max(i - 5, 0):i + len(pattern) + 5])
+                    for i in range(len(text)) if text.startswith(pattern, i)]
+        assert list(search(compressed, pattern, 5)) == expected
+
+    # the offsets are counted in bytes of the file, '\r\n' must not be read as '\n'
+    crlf_log = tmp_path / 'crlf.log'
+    crlf_log.write_bytes(b'INFO started\r\n' * 30)
+    huffman = Huffman()
+    huffman.parse_uncompressed_file(str(crlf_log))
+    compress_text_to_file(huffman.decoded_text, compressed)
+    with open(crlf_log, 'ab') as log_file:
+        log_file.write(b'INFO stopped\r\n')
+    with open(compressed, 'rb') as compressed_file:
+        before_append = compressed_file.read()
+    # a dry run encodes the appended text, but writes nothing
+    dry_run_segment = append_to_compressed_file(compressed, str(crlf_log), dry_run=True)
+    with open(compressed, 'rb') as compressed_file:
+        assert compressed_file.read() == before_append
+    assert append_to_compressed_file(compressed, str(crlf_log)) == dry_run_segment
+
+    with open(compressed, 'rb') as compressed_file:
+        decoded = decompress_data(compressed_file.read())
+    assert decoded.encode('utf-8') == crlf_log.read_bytes()
+
+    # a stored text may end with the segment magic, and still be a file without segments
+    text = 'ends like an appended file\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00HUFSEG'
+    assert decompress_data(compress_text(text)) == text
+    log.write_text(text)
+    with open(compressed, 'wb') as compressed_file:
+        compressed_file.write(compress_text(text))
+    with open(log, 'a') as log_file:
+        log_file.write('appended')
+    append_to_compressed_file(compressed, str(log))
+    with open(compressed, 'rb') as compressed_file:
+        assert decompress_data(compressed_file.read()) == text + 'appended'
+
+    # a valid header followed by a corrupt payload
+    with open(compressed, 'wb') as compressed_file:
+        compressed_file.write(bytes([0x02, 0x61, 0x01, 0x01, 0x03, 0xff, 0x30]))
+    with pytest.raises(NoHeader):
+        append_to_compressed_file(compressed, str(log))
+
+
+def test_huffman_file_text_mode():
+    text = 'first line\nsecond line 😀\n' * 100 + 'last line'
+    compressed = io.BytesIO()
+    with huffman_file.open(compressed, 'wt') as output_file:
+        output_file.write(text)
+
+    compressed.seek(0)
+    with huffman_file.open(compressed, 'rt') as input_file:
+        lines = input_file.readlines()
+    assert ''.join(lines) == text
+    assert lines[1] == 'second line 😀\n'
+
+    # the codec only works on utf-8 text
+    with huffman_file.open(io.BytesIO(compressed.getvalue()), 'rt', encoding='UTF8') as input_file:
+        assert input_file.read() == text
+    with pytest.raises(ValueError):
+        huffman_file.open(compressed, 'wt', encoding='latin-1')
+
+
+def test_huffman_file_binary_mode():
+    data = ('aaaaaaaabbbbbbbcccccc' * 50).encode('utf-8')
+    with huffman_file.HuffmanFile(TEST_FILE, 'wb') as output_file:
+        output_file.write(data)
+
+    with huffman_file.HuffmanFile(TEST_FILE) as input_file:
+        start = input_file.read(10)
+        input_file.seek(500)
+        middle = input_file.read(10)
+        input_file.seek(3)
+        buffer = bytearray(5)
+        size = input_file.readinto(buffer)
+        with pytest.raises(io.UnsupportedOperation):
+            input_file.write(data)
+    os.remove(TEST_FILE)
+    assert start == data[:10]
+    assert middle == data[500:510]
+    assert (size, bytes(buffer)) == (5, data[3:8])
+
+
+def test_huffman_compute_compressed_size():
+    huffman = Huffman()
+    huffman.decoded_text = 'aaaaaaaabbbbbbbcccccc\'\'\'\'\'>>>日本' * 7
+    huffman.build_symbol_heap()
+    huffman.sort_symbol_heap()
+    huffman.build_code_tables()
+    huffman.build_header()
+    size = huffman.compute_compressed_size()
+    huffman.build_encoded_text()
+    huffman.write_encoded_text_to_file(TEST_FILE)
+    written_size = os.stat(TEST_FILE).st_size
+    os.remove(TEST_FILE)
+    assert size == written_size